@@ -0,0 +1,113 @@
+# every image the game uses, by name, and the pre-built atlas they are packed into
+#
+# python build_atlas.py cuts the regions below out of their sheets, scales the tiles to
+# TILE_SIZE and packs them all into ATLAS_IMAGE, with their positions in ATLAS_MANIFEST.
+# The game then decodes that one image and uses subsurfaces of it. If the atlas is missing or
+# was built for another tile size, the images are cut from the sheets at startup instead.
+import json
+import os
+
+import pygame
+from settings import *
+
+ATLAS_IMAGE = 'assets/atlas.png'
+ATLAS_MANIFEST = 'assets/atlas.json'
+# fills the atlas where regions are transparent
+ATLAS_COLORKEY = (255, 0, 255)
+
+DIVER = 'assets/diver.png'
+SHARK = 'assets/shark.png'
+TILES = 'assets/tilemap_2.png'
+ENEMY_TILES = 'assets/enemy_rocks.png'
+DOOR = 'assets/door_image.png'
+
+# name: (sheet, rectangle, colorkey, scaled to the tile size)
+# colorkey is as in SpriteSheet.image_at: -1 samples (0, 0), -2 samples (2, 63)
+REGIONS = {
+    'diver_right_run_1': (DIVER, (41, 99, 14, 27), -1, False),
+    'diver_right_run_2': (DIVER, (22, 131, 14, 27), -1, False),
+    'diver_right_run_3': (DIVER, (41, 131, 14, 27), -1, False),
+    'diver_stand_right': (DIVER, (41, 3, 14, 27), -1, False),
+    'diver_left_run_1': (DIVER, (60, 99, 14, 27), -1, False),
+    'diver_left_run_2': (DIVER, (3, 131, 14, 27), -1, False),
+    'diver_left_run_3': (DIVER, (60, 131, 14, 27), -1, False),
+    'diver_stand_left': (DIVER, (60, 3, 14, 27), -1, False),
+
+    'shark_right_1': (SHARK, (155, 28, 104, 34), -1, False),
+    'shark_right_2': (SHARK, (155, 65, 104, 34), -1, False),
+    'shark_right_3': (SHARK, (155, 154, 104, 34), -1, False),
+    'shark_right_4': (SHARK, (155, 195, 104, 34), -1, False),
+    'shark_left_1': (SHARK, (8, 28, 104, 32), -1, False),
+    'shark_left_2': (SHARK, (8, 65, 104, 37), -1, False),
+    'shark_left_3': (SHARK, (8, 154, 104, 37), -1, False),
+    'shark_left_4': (SHARK, (8, 195, 104, 37), -1, False),
+
+    # main rocks tiles
+    'left_end_rock': (TILES, (0, 0, 64, 64), -2, True),
+    'left_rock': (TILES, (65, 0, 64, 64), -2, True),
+    'right_rock': (TILES, (65, 64, 64, 64), -2, True),
+    'right_end_rock': (TILES, (0, 64, 64, 64), -2, True),
+    # enemy rocks tiles
+    'le_enemy_rock': (ENEMY_TILES, (0, 0, 64, 64), -2, True),
+    'l_enemy_rock': (ENEMY_TILES, (65, 0, 64, 64), -2, True),
+    'r_enemy_rock': (ENEMY_TILES, (65, 64, 64, 64), -2, True),
+    're_enemy_rock': (ENEMY_TILES, (0, 64, 64, 64), -2, True),
+    # door tile
+    'door': (DOOR, (0, 0, 128, 128), None, True),
+}
+
+
+def pack(sizes, width):
+    """Shelf-pack (name, (w, h)) pairs into rows width pixels wide.
+    Returns the atlas height and {name: (x, y, w, h)}, with a pixel of space around each region.
+    """
+    regions = {}
+    x = y = shelf = 0
+    for name, (w, h) in sorted(sizes, key=lambda item: -item[1][1]):
+        if x + w + 1 > width:
+            x = 0
+            y += shelf + 1
+            shelf = 0
+        regions[name] = (x, y, w, h)
+        x += w + 1
+        shelf = max(shelf, h)
+    return y + shelf, regions
+
+
+def load_atlas(tile_size=TILE_SIZE):
+    """Decode the atlas, returns (surface, {name: rectangle}) or None if it can't be used."""
+    try:
+        with open(ATLAS_MANIFEST) as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('tile_size') != tile_size or set(manifest.get('regions', ())) != set(REGIONS):
+        return None
+    try:
+        image = pygame.image.load(ATLAS_IMAGE).convert()
+    except (pygame.error, FileNotFoundError):
+        return None
+    # subsurfaces share the colorkey of the atlas
+    image.set_colorkey(manifest['colorkey'])
+    return image, {name: tuple(rect) for name, rect in manifest['regions'].items()}
+
+
+def build_atlas(cut, tile_size=TILE_SIZE, width=512):
+    """Write ATLAS_IMAGE and ATLAS_MANIFEST, cut(name, tile_size) returns the image of a region."""
+    images = {name: cut(name, tile_size) for name in REGIONS}
+    height, regions = pack([(name, image.get_size()) for name, image in images.items()], width)
+    atlas = pygame.Surface((width, height))
+    atlas.fill(ATLAS_COLORKEY)
+    for name, image in images.items():
+        # colorkeyed pixels are skipped, so they stay ATLAS_COLORKEY
+        atlas.blit(image, regions[name][:2])
+    pygame.image.save(atlas, ATLAS_IMAGE)
+    manifest = {
+        'image': os.path.basename(ATLAS_IMAGE),
+        'tile_size': tile_size,
+        'colorkey': list(ATLAS_COLORKEY),
+        'regions': regions,
+    }
+    with open(ATLAS_MANIFEST, 'w') as file:
+        json.dump(manifest, file, indent=1, sort_keys=True)
+    return regions
@@ -0,0 +1,163 @@
+# run many headless game sessions across a pool of processes and sum up how they went
+# run with: python batch.py --sessions 200  (python batch.py --help for options)
+#
+# Every session is a (level, policy, seed, max_steps) task that only runs the simulation,
+# nothing is drawn. Each worker process keeps the levels it has built and resets them
+# between sessions, so tasks are cheap to send and quick to start.
+import argparse
+import csv
+import os
+import time
+from multiprocessing import Pool
+
+import sprites
+from controls import KEY_STATES, ScriptedInput
+from levelgen import generate_level
+from levels import load_level
+from render import init_headless
+from settings import *
+
+
+def idle(seed):
+    # never touches the keys, the diver just sinks
+    return lambda: KEY_STATES[0]
+
+
+# input policy name -> function of the seed returning a read_keys function
+POLICIES = {
+    'scripted': ScriptedInput,
+    'idle': idle,
+}
+
+# levels built by this worker, level name -> Layout
+layouts = {}
+
+
+def init_worker():
+    """Set up pygame without a window or sound in a worker process."""
+    # SDL would otherwise catch SIGTERM, and the pool could never stop its workers
+    os.environ['SDL_NO_SIGNAL_HANDLERS'] = '1'
+    init_headless()
+
+
+def level_name(level):
+    """Name of a task's level: a level file path, or (height, seed) of a generated level."""
+    if isinstance(level, str):
+        return level
+    return f"generated-{level[0]}-{level[1]}"
+
+
+def get_layout(level):
+    """The Layout of a task's level, built the first time this worker sees it and reset after."""
+    name = level_name(level)
+    layout = layouts.get(name)
+    if layout is None:
+        if isinstance(level, str):
+            layout = sprites.Layout(TILE_SIZE, load_level(level))
+        else:
+            layout = sprites.Layout(TILE_SIZE, generate_level(*level))
+        layouts[name] = layout
+    else:
+        layout.reset()
+    return layout
+
+
+def run_session(task):
+    """Play one task until the exit is reached, a shark catches the player (with SHARKS_BITE)
+    or max_steps pass.
+    Returns a dict of the outcome and timing.
+    """
+    level, policy, seed, max_steps = task
+    layout = get_layout(level)
+    read_keys = POLICIES[policy](seed)
+    steps = 0
+    start = time.perf_counter()
+    while steps < max_steps and not layout.won and not layout.lost:
+        layout.update(read_keys())
+        steps += 1
+    seconds = time.perf_counter() - start
+    outcome = 'won' if layout.won else 'lost' if layout.lost else 'timeout'
+    return {
+        'level': level_name(level),
+        'policy': policy,
+        'seed': seed,
+        'outcome': outcome,
+        'steps': steps,
+        'depth': layout.player.rect.y // TILE_SIZE,
+        'seconds': seconds,
+        'pid': os.getpid(),
+    }
+
+
+def run_batch(tasks, workers=None, chunksize=None):
+    """Run tasks on a pool of workers (default one per core), returns the results in task order."""
+    tasks = list(tasks)
+    workers = workers or os.cpu_count() or 1
+    if chunksize is None:
+        # a few chunks per worker, big enough that sending them costs next to nothing
+        chunksize = max(1, len(tasks) // (workers * 4))
+    with Pool(workers, initializer=init_worker) as pool:
+        return pool.map(run_session, tasks, chunksize)
+
+
+def summarize(results):
+    """Per (level, policy): sessions, outcome counts, mean steps and depth."""
+    groups = {}
+    for result in results:
+        groups.setdefault((result['level'], result['policy']), []).append(result)
+    summary = []
+    for (level, policy), group in sorted(groups.items()):
+        count = len(group)
+        summary.append({
+            'level': level,
+            'policy': policy,
+            'sessions': count,
+            'won': sum(result['outcome'] == 'won' for result in group),
+            'lost': sum(result['outcome'] == 'lost' for result in group),
+            'timeout': sum(result['outcome'] == 'timeout' for result in group),
+            'steps': sum(result['steps'] for result in group) / count,
+            'depth': sum(result['depth'] for result in group) / count,
+        })
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run headless game sessions on a process pool.")
+    parser.add_argument('--levels', nargs='*', default=[LEVEL_FILE], help="level files to play")
+    parser.add_argument('--generate', type=int, nargs='*', default=[], metavar='HEIGHT',
+                        help="also play a generated level of each height (seeded with --level-seed)")
+    parser.add_argument('--level-seed', type=int, default=0, help="seed of the generated levels")
+    parser.add_argument('--policy', choices=sorted(POLICIES), nargs='+', default=['scripted'],
+                        help="input policies to play with")
+    parser.add_argument('--sessions', type=int, default=100, help="sessions per level and policy, seeds 0 to n-1")
+    parser.add_argument('--steps', type=int, default=SIM_RATE * 60, help="most steps a session runs")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default one per core)")
+    parser.add_argument('--csv', metavar='FILE', help="also write every session's result to FILE")
+    args = parser.parse_args()
+
+    levels = list(args.levels) + [(height, args.level_seed) for height in args.generate]
+    tasks = [(level, policy, seed, args.steps)
+             for level in levels for policy in args.policy for seed in range(args.sessions)]
+    start = time.perf_counter()
+    results = run_batch(tasks, args.workers)
+    seconds = time.perf_counter() - start
+    steps = sum(result['steps'] for result in results)
+    workers = len(set(result['pid'] for result in results))
+
+    print(f"{'level':<28} {'policy':<9} {'sessions':>8} {'won':>6} {'lost':>6} {'timeout':>7} "
+          f"{'steps':>8} {'depth':>7}")
+    for row in summarize(results):
+        print(f"{row['level']:<28} {row['policy']:<9} {row['sessions']:>8} {row['won']:>6} {row['lost']:>6} "
+              f"{row['timeout']:>7} {row['steps']:>8.0f} {row['depth']:>7.1f}")
+    print(f"{len(results)} sessions, {steps} steps in {seconds:.2f}s on {workers} workers "
+          f"({steps / seconds:.0f} steps/s)")
+
+    if args.csv:
+        with open(args.csv, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=list(results[0]))
+            writer.writeheader()
+            writer.writerows(results)
+
+
+if __name__ == '__main__':
+    main()
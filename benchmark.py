@@ -0,0 +1,156 @@
+# headless performance benchmark
+# run with: python benchmark.py  (python benchmark.py --help for options)
+import argparse
+import multiprocessing
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+import pygame
+import sprites
+from controls import ScriptedInput
+from levelgen import generate_level
+from levels import load_level
+from render import init_headless
+from settings import *
+
+
+def tall_level(stock, rows):
+    """The stock level rows stretched to at least rows rows by repeating their middle part."""
+    top = stock[:5]
+    middle = stock[5:-2]
+    bottom = stock[-2:]
+    level = list(top)
+    while len(level) + len(bottom) < rows:
+        level.extend(middle)
+    return level + bottom
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    index = min(int(len(ordered) * percent / 100), len(ordered) - 1)
+    return ordered[index]
+
+
+def max_rss():
+    """Peak resident size of the process in MiB, this also counts pygame surfaces.
+    Every benchmark runs in a process of its own, so this is the peak of that run alone.
+    """
+    if resource is None:
+        return float('nan')
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(name, rows, setup):
+    """Build a benchmark with setup() and report its frame time percentiles and memory.
+    Python memory is traced over a separate, untimed pass that builds the level and plays it,
+    so bands streamed in during play are counted. The timed pass runs untraced so it is not
+    slowed down.
+    """
+    tracemalloc.start()
+    setup()([])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    run = setup()
+    frame_times = []
+    start = time.perf_counter()
+    run(frame_times)
+    total = time.perf_counter() - start
+    if not frame_times:
+        return
+    print(f"{name:<8} {rows:>7} {len(frame_times):>7} "
+          f"{percentile(frame_times, 50) * 1000:>8.3f} {percentile(frame_times, 95) * 1000:>8.3f} "
+          f"{percentile(frame_times, 99) * 1000:>8.3f} {len(frame_times) / total:>10.0f} "
+          f"{peak / 1024 / 1024:>9.1f} {max_rss():>8.1f}")
+
+
+def bench_update(level, frames, seed):
+    # just the simulation: Layout, Player and Shark updates, nothing drawn
+    layout = sprites.Layout(TILE_SIZE, level)
+    read_keys = ScriptedInput(seed)
+
+    def run(frame_times):
+        for frame in range(frames):
+            start = time.perf_counter()
+            layout.update(read_keys())
+            frame_times.append(time.perf_counter() - start)
+    return run
+
+
+def bench_draw(level, frames, seed):
+    # simulation and drawing, without the rest of the game loop
+    layout = sprites.Layout(TILE_SIZE, level)
+    read_keys = ScriptedInput(seed)
+    screen = pygame.display.get_surface()
+
+    def run(frame_times):
+        for frame in range(frames):
+            start = time.perf_counter()
+            layout.update(read_keys())
+            layout.draw(screen)
+            frame_times.append(time.perf_counter() - start)
+    return run
+
+
+def bench_game(level, frames, seed):
+    # the real game() loop with scripted keys and no frame rate limit
+    import main
+    layout = sprites.Layout(TILE_SIZE, level)
+
+    def run(frame_times):
+        main.game(layout, ScriptedInput(seed), frames, False, frame_times)
+    return run
+
+
+BENCHMARKS = {
+    'update': bench_update,
+    'draw': bench_draw,
+    'game': bench_game,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless frame time benchmark.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[0, 1000, 10000],
+                        help="level heights to run, LEVEL_FILE is stretched to each (0 = as is)")
+    parser.add_argument('--frames', type=int, default=2000, help="frames per run")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the scripted input and generated levels")
+    parser.add_argument('--generate', action='store_true',
+                        help="run on levels from levelgen.py instead of the stretched LEVEL_FILE")
+    parser.add_argument('--only', choices=sorted(BENCHMARKS), nargs='+', default=list(BENCHMARKS),
+                        help="which benchmarks to run")
+    args = parser.parse_args()
+
+    print(f"{'bench':<8} {'rows':>7} {'frames':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'frames/s':>10} {'peak MiB':>9} {'rss MiB':>8}")
+    # a fresh process for every run, so the memory of one run is never counted in the next
+    context = multiprocessing.get_context('spawn')
+    for rows in args.rows:
+        for name in args.only:
+            with context.Pool(1) as pool:
+                pool.apply(run_benchmark, (name, rows, args))
+
+
+def run_benchmark(name, rows, args):
+    """Set up pygame and the level in this process, then measure one benchmark on it."""
+    init_headless()
+    stock = load_level(LEVEL_FILE).rows()
+    if rows <= len(stock):
+        level = stock
+    elif args.generate:
+        level = generate_level(rows, args.seed)
+    else:
+        level = tall_level(stock, rows)
+    setup = BENCHMARKS[name]
+    measure(name, len(level), lambda: setup(level, args.frames, args.seed))
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
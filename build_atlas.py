@@ -0,0 +1,19 @@
+# pre-scales every image the game uses into one atlas, run it again after changing a sheet
+# run with: python build_atlas.py
+import pygame
+from atlas import ATLAS_IMAGE, ATLAS_MANIFEST, build_atlas
+from render import init_headless
+from settings import *
+from sprites import asset_cache
+
+
+def main():
+    # the sheets are converted to the display format, so a (hidden) display is needed
+    init_headless()
+    regions = build_atlas(asset_cache.cut)
+    print(f"packed {len(regions)} images into {ATLAS_IMAGE}, regions in {ATLAS_MANIFEST}")
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
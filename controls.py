@@ -0,0 +1,57 @@
+import random
+
+import pygame
+
+
+class KeyState:
+    # stands in for pygame.key.get_pressed() when something other than the keyboard plays
+    def __init__(self, pressed=()):
+        self.pressed = frozenset(pressed)
+
+    def __getitem__(self, key):
+        return key in self.pressed
+
+
+# the keys the player reacts to, as bits of a key mask
+MASK_KEYS = [pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP]
+# every combination of those keys, indexed by mask
+KEY_STATES = [KeyState(key for bit, key in enumerate(MASK_KEYS) if mask & (1 << bit))
+              for mask in range(1 << len(MASK_KEYS))]
+
+
+def key_mask(keys):
+    """The MASK_KEYS held in keys as a small int, KEY_STATES[mask] gives the keys back."""
+    mask = 0
+    for bit, key in enumerate(MASK_KEYS):
+        if keys[key]:
+            mask |= 1 << bit
+    return mask
+
+
+# the key combinations a scripted player chooses from
+MOVES = [
+    KeyState(),
+    KeyState([pygame.K_RIGHT]),
+    KeyState([pygame.K_LEFT]),
+    KeyState([pygame.K_UP]),
+    KeyState([pygame.K_RIGHT, pygame.K_UP]),
+    KeyState([pygame.K_LEFT, pygame.K_UP]),
+]
+
+
+class ScriptedInput:
+    # seeded random player: holds one of MOVES for a random number of steps, then picks another
+    def __init__(self, seed=0, min_hold=5, max_hold=60):
+        self.random = random.Random(seed)
+        self.min_hold = min_hold
+        self.max_hold = max_hold
+        self.keys = MOVES[0]
+        self.hold = 0
+
+    def __call__(self):
+        """Key state for the next simulation step."""
+        if self.hold == 0:
+            self.keys = self.random.choice(MOVES)
+            self.hold = self.random.randint(self.min_hold, self.max_hold)
+        self.hold -= 1
+        return self.keys
@@ -0,0 +1,109 @@
+import numpy as np
+import pygame
+from settings import *
+
+
+class SharkSwarm:
+    # every shark of a level, stored as arrays instead of one sprite object each,
+    # so all of them are moved, animated and tested against the player at once
+    def __init__(self, spawns, speed, right_images, left_images, copies=1):
+        """spawns is a list of (x, y) world positions, one shark swims right from each.
+        right_images and left_images are the animation frames for each direction.
+        With copies > 1 the swarm holds the sharks of that many separate games of the level,
+        copy after copy, so they can all be stepped together.
+        """
+        # all frames in one list, image index = direction * frames + frame
+        self.images = list(right_images) + list(left_images)
+        self.frame_count = len(right_images)
+        self.image_width = np.array([image.get_width() for image in self.images], dtype=np.int32)
+        self.image_height = np.array([image.get_height() for image in self.images], dtype=np.int32)
+
+        self.copies = copies
+        self.per_copy = len(spawns)
+        self.spawns = np.tile(np.array(spawns, dtype=np.int32).reshape(len(spawns), 2), (copies, 1))
+        self.start_speed = speed
+        self.reset()
+
+    def reset(self, copy=None):
+        """Put every shark back on its spawn, as when the level was loaded, or only the sharks
+        of one copy.
+        """
+        if copy is not None:
+            part = slice(copy * self.per_copy, (copy + 1) * self.per_copy)
+            self.x[part] = self.spawns[part, 0]
+            self.y[part] = self.spawns[part, 1]
+            self.prev_x[part] = self.spawns[part, 0]
+            self.speed[part] = self.start_speed
+            self.direct[part] = 0
+            self.current_frame[part] = 0
+            self.image[part] = 1
+            # animation only looks at steps - last, so this is the same as starting over
+            self.last[part] = self.steps - self.delay
+            return
+        count = len(self.spawns)
+        self.x = self.spawns[:, 0].copy()
+        self.y = self.spawns[:, 1].copy()
+        # positions before the last step, for drawing in between steps
+        self.prev_x = self.x
+        self.speed = np.full(count, self.start_speed, dtype=np.int32)
+        # 0 swims right, 1 swims left
+        self.direct = np.zeros(count, dtype=np.int32)
+        # same animation as the player: current_frame counts up, image is what is shown
+        self.current_frame = np.zeros(count, dtype=np.int32)
+        self.image = np.ones(count, dtype=np.int32)
+        self.steps = 0
+        self.delay = ANIMATION_DELAY
+        self.last = np.full(count, -self.delay, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.x)
+
+    def update(self):
+        """Move and animate every shark by one simulation step."""
+        self.prev_x = self.x
+        self.steps += 1
+        # sharks swim straight on, through tiles and out of the level
+        self.x = self.x + np.where(self.direct == 0, self.speed, -self.speed)
+
+        # next animation frame for the sharks whose delay is up
+        due = self.steps - self.last >= self.delay
+        if due.any():
+            self.last = np.where(due, self.steps, self.last)
+            wrapped = np.where(self.current_frame >= self.frame_count, 1, self.current_frame)
+            self.current_frame = np.where(due, wrapped, self.current_frame)
+            shown = self.direct * self.frame_count + self.current_frame
+            self.image = np.where(due, shown, self.image)
+            self.current_frame = np.where(due, self.current_frame + 1, self.current_frame)
+
+    def hits(self, rect):
+        """True if any shark overlaps rect."""
+        width = self.image_width[self.image]
+        height = self.image_height[self.image]
+        overlap = (self.x < rect.right) & (self.x + width > rect.left) & \
+                  (self.y < rect.bottom) & (self.y + height > rect.top)
+        return bool(overlap.any())
+
+    def hits_each(self, left, top, right, bottom):
+        """For every copy, True if one of its sharks overlaps the rect given for that copy.
+        The sides of the rects are arrays with one entry per copy.
+        """
+        shape = (self.copies, self.per_copy)
+        x = self.x.reshape(shape)
+        y = self.y.reshape(shape)
+        width = self.image_width[self.image].reshape(shape)
+        height = self.image_height[self.image].reshape(shape)
+        overlap = (x < right[:, None]) & (x + width > left[:, None]) & \
+                  (y < bottom[:, None]) & (y + height > top[:, None])
+        return overlap.any(axis=1)
+
+    def visible(self, camera_y, alpha=1.0):
+        """(image, screen rect) of the sharks inside the view, blended between the last two steps."""
+        height = self.image_height[self.image]
+        shown = np.nonzero((self.y + height > camera_y) & (self.y < camera_y + WIN_HEIGHT))[0]
+        xs = np.rint(self.prev_x[shown] + (self.x[shown] - self.prev_x[shown]) * alpha).astype(np.int32)
+        sprites = []
+        for index, x in zip(shown.tolist(), xs.tolist()):
+            image = self.images[self.image[index]]
+            sprites.append((image, pygame.Rect(x, int(self.y[index]) - camera_y,
+                                               image.get_width(), image.get_height())))
+        return sprites
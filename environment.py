@@ -0,0 +1,210 @@
+# step/reset environments for automated players, headless and many at a time
+#
+#   envs = VecEnv(64)
+#   obs, infos = envs.reset()
+#   obs, rewards, terminated, truncated, infos = envs.step(actions)
+#
+# Actions are indexes into controls.MOVES. Observations are a dict of NumPy arrays with one
+# entry per environment:
+#   tiles   (VIEW_ROWS, VIEW_COLUMNS) uint8 tile codes around the player, see TILE_CODES
+#   player  x, y (world pixels), dx, dy (pixels moved in the last step), vertical velocity
+#   sharks  (NEAREST_SHARKS, 4) the nearest sharks: dx, dy from the player, direction
+#           (1 right, -1 left) and 1 for a real shark or 0 for padding
+# All environments play the same level in lockstep. Their players step one after the other,
+# then the sharks of every environment move as one swarm.
+import time
+
+import numpy as np
+import sprites
+from controls import MOVES, ScriptedInput
+from enemies import SharkSwarm
+from levels import Level, load_level
+from render import init_headless
+from settings import *
+
+# tile codes in observations
+WATER = 0
+ROCK = 1
+ALGAE = 2
+EXIT = 3
+OUTSIDE = 4
+TILE_CODES = np.full(256, WATER, dtype=np.uint8)
+TILE_CODES[list(b'1234')] = ROCK
+TILE_CODES[list(b'abcd')] = ALGAE
+TILE_CODES[ord('D')] = EXIT
+
+# size of the tile window around the player, odd so the player is in the middle
+VIEW_ROWS = 15
+VIEW_COLUMNS = 15
+NEAREST_SHARKS = 4
+# rewards: one per row of new depth reached, plus these when a game ends
+WIN_REWARD = 100.0
+LOSE_REWARD = -100.0
+
+
+class VecEnv:
+    # count games of one level, stepped together
+    action_count = len(MOVES)
+
+    def __init__(self, count, level=None, max_steps=SIM_RATE * 120):
+        """level is a levels.Level or rows of tile characters, the default is LEVEL_FILE.
+        A game is cut off (truncated) after max_steps steps.
+        """
+        init_headless()
+        if level is None:
+            level = load_level(LEVEL_FILE)
+        elif not isinstance(level, Level):
+            level = Level.from_rows(level)
+        self.count = count
+        self.max_steps = max_steps
+        self.layouts = [sprites.Layout(TILE_SIZE, level) for i in range(count)]
+        # the sharks of every game in one swarm, the layouts' own sharks are not used
+        first = self.layouts[0]
+        self.sharks = SharkSwarm(first.sharks.spawns, SHARK_SPEED,
+                                 first.sharks.images[:first.sharks.frame_count],
+                                 first.sharks.images[first.sharks.frame_count:], count)
+
+        # tile codes of the whole level, with a border of OUTSIDE as wide as the view
+        cells = np.frombuffer(level.cells, dtype=np.uint8, count=level.width * level.height,
+                              offset=level.offset).reshape(level.height, level.width)
+        self.pad_rows = VIEW_ROWS // 2
+        self.pad_columns = VIEW_COLUMNS // 2
+        self.tiles = np.pad(TILE_CODES[cells], ((self.pad_rows, self.pad_rows), (self.pad_columns, self.pad_columns)),
+                            constant_values=OUTSIDE)
+        self.view_rows = np.arange(VIEW_ROWS)
+        self.view_columns = np.arange(VIEW_COLUMNS)
+
+        self.steps = np.zeros(count, dtype=np.int64)
+        # deepest row each player has reached, for the depth reward
+        self.depth = np.zeros(count, dtype=np.int64)
+
+    def reset(self):
+        """Start every game over, returns (observations, infos)."""
+        for i in range(self.count):
+            self.reset_one(i)
+        return self.observe(), [{} for i in range(self.count)]
+
+    def reset_one(self, i):
+        layout = self.layouts[i]
+        layout.reset()
+        self.sharks.reset(i)
+        self.steps[i] = 0
+        self.depth[i] = layout.player.rect.bottom // TILE_SIZE
+
+    def step(self, actions):
+        """Play one step of every game, actions has one index into MOVES per game.
+        Returns (observations, rewards, terminated, truncated, infos). A game that ended is
+        started over right away, so its observation is already the first of the next game,
+        the last one of the game that ended is in its info as 'final_observation'.
+        """
+        layouts = self.layouts
+        for layout, action in zip(layouts, actions):
+            layout.update_player(MOVES[action])
+        self.sharks.update()
+        rects = np.array([layout.player.rect for layout in layouts], dtype=np.int32).reshape(self.count, 4)
+        if SHARKS_BITE:
+            caught = self.sharks.hits_each(rects[:, 0], rects[:, 1], rects[:, 0] + rects[:, 2],
+                                           rects[:, 1] + rects[:, 3])
+        else:
+            caught = np.zeros(self.count, dtype=bool)
+        self.steps += 1
+
+        depth = (rects[:, 1] + rects[:, 3]) // TILE_SIZE
+        rewards = np.maximum(depth - self.depth, 0).astype(np.float32)
+        self.depth = np.maximum(depth, self.depth)
+        # the same exit test as layout.won, but right after the move, won is only set at the
+        # start of the next step
+        won = np.array([layout.at_exit() for layout in layouts])
+        lost = caught | np.array([layout.lost for layout in layouts])
+        rewards += np.where(won, WIN_REWARD, 0.0) + np.where(lost, LOSE_REWARD, 0.0)
+        terminated = won | lost
+        truncated = ~terminated & (self.steps >= self.max_steps)
+
+        observations = self.observe()
+        infos = [{} for i in range(self.count)]
+        for i in np.nonzero(terminated | truncated)[0]:
+            infos[i] = {'final_observation': {key: value[i].copy() for key, value in observations.items()},
+                        'steps': int(self.steps[i]), 'won': bool(won[i]), 'lost': bool(lost[i])}
+            self.reset_one(i)
+            for key, value in self.observe(i).items():
+                observations[key][i] = value
+        return observations, rewards, terminated, truncated, infos
+
+    def observe(self, i=None):
+        """Observations of every game, or of game i only (without the first axis)."""
+        layouts = self.layouts if i is None else [self.layouts[i]]
+        count = len(layouts)
+        players = np.array([(layout.player.rect.x, layout.player.rect.y,
+                             layout.player.rect.x - layout.player.prev_pos[0],
+                             layout.player.rect.y - layout.player.prev_pos[1],
+                             layout.player.velocity_y) for layout in layouts], dtype=np.float32)
+        players = players.reshape(count, 5)
+        heights = np.array([layout.player.rect.height for layout in layouts])
+        widths = np.array([layout.player.rect.width for layout in layouts])
+
+        # the cell of the player's feet is in the middle of the view
+        column = (players[:, 0].astype(np.int64) + widths // 2) // TILE_SIZE
+        row = (players[:, 1].astype(np.int64) + heights - 1) // TILE_SIZE
+        # with the padding in front, the view around a cell starts at that cell's own index
+        rows = np.clip(row, 0, len(self.tiles) - VIEW_ROWS)[:, None] + self.view_rows
+        columns = np.clip(column, 0, self.tiles.shape[1] - VIEW_COLUMNS)[:, None] + self.view_columns
+        tiles = self.tiles[rows[:, :, None], columns[:, None, :]]
+
+        shape = (self.count, self.sharks.per_copy)
+        x = self.sharks.x.reshape(shape)
+        y = self.sharks.y.reshape(shape)
+        direct = self.sharks.direct.reshape(shape)
+        if i is not None:
+            x, y, direct = x[i:i + 1], y[i:i + 1], direct[i:i + 1]
+        sharks = np.zeros((count, NEAREST_SHARKS, 4), dtype=np.float32)
+        if self.sharks.per_copy:
+            dx = x - players[:, 0:1]
+            dy = y - players[:, 1:2]
+            nearest = np.argsort(dx * dx + dy * dy, axis=1)[:, :NEAREST_SHARKS]
+            found = nearest.shape[1]
+            sharks[:, :found, 0] = np.take_along_axis(dx, nearest, axis=1)
+            sharks[:, :found, 1] = np.take_along_axis(dy, nearest, axis=1)
+            sharks[:, :found, 2] = 1 - 2 * np.take_along_axis(direct, nearest, axis=1)
+            sharks[:, :found, 3] = 1
+
+        observations = {'tiles': tiles, 'player': players, 'sharks': sharks}
+        if i is not None:
+            observations = {key: value[0] for key, value in observations.items()}
+        return observations
+
+
+class GameEnv:
+    # one game, same observations as VecEnv but without the first axis
+    action_count = VecEnv.action_count
+
+    def __init__(self, level=None, max_steps=SIM_RATE * 120):
+        self.envs = VecEnv(1, level, max_steps)
+
+    def reset(self):
+        observations, infos = self.envs.reset()
+        return {key: value[0] for key, value in observations.items()}, infos[0]
+
+    def step(self, action):
+        observations, rewards, terminated, truncated, infos = self.envs.step([action])
+        return ({key: value[0] for key, value in observations.items()}, float(rewards[0]),
+                bool(terminated[0]), bool(truncated[0]), infos[0])
+
+
+def main():
+    # steps per second of random play at a few batch sizes
+    init_headless()
+    for count in (1, 16, 64, 256):
+        envs = VecEnv(count)
+        envs.reset()
+        policies = [ScriptedInput(seed) for seed in range(count)]
+        moves = {id(move): index for index, move in enumerate(MOVES)}
+        steps = max(20000 // count, 50)
+        start = time.perf_counter()
+        for step in range(steps):
+            envs.step([moves[id(policy())] for policy in policies])
+        seconds = time.perf_counter() - start
+        print(f"{count:>4} environments: {count * steps / seconds:>8.0f} steps/s")
+
+
+if __name__ == '__main__':
+    main()
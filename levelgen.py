@@ -0,0 +1,110 @@
+# seeded level generator, for levels bigger than anyone wants to draw by hand
+# write one with: python levelgen.py levels/stress.txt --height 5000 --seed 1
+#
+# Levels use the same tiles as a hand-made level file (see levels.py): rock platforms
+# (1 left end, 2 and 4 middle, 3 right end), algae platforms (a left end, b and d middle,
+# c right end), P, e and D. Every level is checked with reachable() before it is returned.
+import argparse
+import random
+
+from levels import Level
+from navigation import PLAY_COLUMNS, NavGraph
+from settings import *
+
+# a platform needs this many rows of water above it for the player (27 px tall) to walk on it
+PLATFORM_GAP = 3
+
+
+def platform(rng, length, algae):
+    """length tiles of rock or algae, with end pieces on both sides."""
+    left, middle, right = ('a', 'bd', 'c') if algae else ('1', '24', '3')
+    if length == 1:
+        return middle[0]
+    return left + ''.join(rng.choice(middle) for i in range(length - 2)) + right
+
+
+def generate_rows(height, seed=0, density=0.5, algae_ratio=0.25, sharks=10):
+    """One try at a level: rows of tile characters, not checked for reachability.
+    density is the chance of a platform on each row where one fits, algae_ratio the share of
+    platforms that are algae, sharks how many sharks swim in the level (fewer if it is too small).
+    """
+    rng = random.Random(seed)
+    water = '0' * PLAY_COLUMNS
+    rows = [water] * height
+
+    # player start on a rock ledge in the top left, like level 1
+    rows[3] = '0P' + water[2:]
+    ledge = rng.randint(4, PLAY_COLUMNS // 2)
+    rows[4] = platform(rng, ledge, False) + water[ledge:]
+
+    # platforms, always leaving a gap somewhere in the row to fall through
+    last = 4
+    for i in range(5, height - 2):
+        if i - last < PLATFORM_GAP or rng.random() >= density:
+            continue
+        length = rng.randint(2, PLAY_COLUMNS - 4)
+        start = rng.randint(0, PLAY_COLUMNS - length)
+        tiles = platform(rng, length, rng.random() < algae_ratio)
+        rows[i] = water[:start] + tiles + water[start + length:]
+        last = i
+
+    # sharks start at the left edge of rows with water above and below to swim in, which
+    # keeps them from starting on top of each other,
+    # and leaves the first screen of the level to get going in
+    candidates = list(range(min(CHUNK_ROWS, height // 2), height - 3))
+    rng.shuffle(candidates)
+    placed = 0
+    for i in candidates:
+        if placed == sharks:
+            break
+        if rows[i - 1] == rows[i] == rows[i + 1] == water:
+            rows[i] = 'e' + water[1:]
+            placed += 1
+
+    # the exit at the bottom right, on a floor of rock
+    rows[-2] = water[:-1] + 'D'
+    rows[-1] = ''.join(rng.choice('24') for i in range(PLAY_COLUMNS))
+    # the wall column, the floor runs under it
+    return [row + '1' for row in rows[:-1]] + [rows[-1] + rng.choice('24')]
+
+
+def reachable(rows):
+    """True if the player can get from P to the exit, see navigation.NavGraph for the moves."""
+    return NavGraph(Level.from_rows(rows)).can_reach()
+
+
+def generate_level(height=200, seed=0, density=0.5, algae_ratio=0.25, sharks=10, attempts=20):
+    """A level of height rows whose exit can be reached, as rows of tile characters.
+    The same arguments always give the same level.
+    """
+    if height < 10:
+        raise ValueError("a level needs at least 10 rows")
+    rng = random.Random(seed)
+    for attempt in range(attempts):
+        rows = generate_rows(height, rng.getrandbits(32), density, algae_ratio, sharks)
+        if reachable(rows):
+            return rows
+    raise ValueError(f"no level with a reachable exit in {attempts} attempts, try a lower density")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a generated level file.")
+    parser.add_argument('path', help="level file to write, e.g. levels/stress.txt")
+    parser.add_argument('--height', type=int, default=200, help="rows in the level")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--density', type=float, default=0.5,
+                        help="chance of a platform on each row where one fits (0-1)")
+    parser.add_argument('--algae', type=float, default=0.25, help="share of platforms that are algae (0-1)")
+    parser.add_argument('--sharks', type=int, default=10, help="number of sharks")
+    args = parser.parse_args()
+
+    rows = generate_level(args.height, args.seed, args.density, args.algae, args.sharks)
+    with open(args.path, 'w') as file:
+        file.write(f"# generated by: python levelgen.py {args.path} --height {args.height} --seed {args.seed} "
+                   f"--density {args.density} --algae {args.algae} --sharks {args.sharks}\n")
+        file.write('\n'.join(rows) + '\n')
+    print(f"{args.path}: {len(rows)} rows")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+# level files
+#
+# A level is a text file with one row of tile characters per line (lines starting with # are
+# comments):
+#   0 water, 1-4 rocks, a-d algae, P player start, e shark, D exit
+#
+# The first time a level is loaded it is compiled into a binary file next to it (level_1.txt ->
+# level_1.lvl) and later loads just memory-map that file. The binary file holds:
+#   header    magic, width, height, entity count, size and mtime of the text file
+#   entities  (character, column, row) for every P, e and D
+#   cells     width * height bytes, the tile character of each cell, row after row
+# It is rebuilt whenever the text file changes. The cells are the level's tile grid as they
+# are: sprites.Layout finds its tiles in them and draws them through a palette of images.
+import mmap
+import os
+import re
+import struct
+import zlib
+
+HEADER = struct.Struct('<4sIIIqq')
+ENTITY_RECORD = struct.Struct('<cII')
+MAGIC = b'LVL1'
+
+TILE_CHARS = b'01234abcdPeD'
+ENTITY = re.compile(b'[PeD]')
+
+
+class Level:
+    # the cells of a level as one byte per tile, plus where the player, sharks and exit are
+    def __init__(self, width, height, cells, entities, offset=0, source=None):
+        self.width = width
+        self.height = height
+        # bytes-like holding the cells from offset on (bytes, or an mmap of a compiled file)
+        self.cells = cells
+        self.offset = offset
+        # list of (character, column, row)
+        self.entities = entities
+        # keeps the mapped file open for as long as the level is used
+        self.source = source
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build a level in memory from rows of tile characters, like the lines of a level file."""
+        width = max(len(row) for row in rows)
+        cells = bytearray()
+        entities = []
+        for i, row in enumerate(rows):
+            line = row.ljust(width, '0').encode('ascii')
+            bad = line.translate(None, TILE_CHARS)
+            if bad:
+                raise ValueError(f"row {i}: unknown tile character {chr(bad[0])!r}")
+            for match in ENTITY.finditer(line):
+                entities.append((match.group().decode(), match.start(), i))
+            cells += line
+        return cls(width, len(rows), bytes(cells), entities)
+
+    def __len__(self):
+        return self.height
+
+    def __getitem__(self, i):
+        """Row i as a string, so a Level can be used like a list of rows."""
+        if i < 0:
+            i += self.height
+        if not 0 <= i < self.height:
+            raise IndexError(i)
+        start = self.offset + i * self.width
+        return bytes(self.cells[start:start + self.width]).decode('ascii')
+
+    def rows(self):
+        return [self[i] for i in range(self.height)]
+
+    def row_matches(self, pattern, i):
+        """(first column, end column, matched bytes) of every match of pattern in row i."""
+        start = self.offset + i * self.width
+        for match in pattern.finditer(self.cells, start, start + self.width):
+            yield match.start() - start, match.end() - start, match.group()
+
+    def checksum(self):
+        """CRC of the cells, to tell whether two levels are the same."""
+        start = self.offset
+        return zlib.crc32(self.cells[start:start + self.width * self.height])
+
+    def close(self):
+        if self.source is not None:
+            self.source.close()
+            self.source = None
+
+
+def read_rows(path):
+    """The rows of a level text file, without comments and blank lines."""
+    with open(path) as file:
+        lines = [line.strip() for line in file]
+    return [line for line in lines if line and not line.startswith('#')]
+
+
+def compiled_path(path):
+    return os.path.splitext(path)[0] + '.lvl'
+
+
+def compile_level(path):
+    """Compile the level text file at path into its binary file."""
+    level = Level.from_rows(read_rows(path))
+    stat = os.stat(path)
+    data = bytearray(HEADER.pack(MAGIC, level.width, level.height, len(level.entities),
+                                 stat.st_size, stat.st_mtime_ns))
+    for char, col, row in level.entities:
+        data += ENTITY_RECORD.pack(char.encode('ascii'), col, row)
+    data += level.cells
+    # write to a temporary file first, so a crash never leaves half a level behind
+    target = compiled_path(path)
+    with open(target + '.tmp', 'wb') as file:
+        file.write(data)
+    os.replace(target + '.tmp', target)
+    return target
+
+
+def map_level(path, stat=None):
+    """Memory-map a compiled level, returns None if it is missing or out of date."""
+    target = compiled_path(path)
+    try:
+        file = open(target, 'rb')
+    except OSError:
+        return None
+    with file:
+        try:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty file
+            return None
+    if len(mapped) < HEADER.size:
+        mapped.close()
+        return None
+    magic, width, height, count, size, mtime = HEADER.unpack_from(mapped, 0)
+    offset = HEADER.size + count * ENTITY_RECORD.size
+    if magic != MAGIC or len(mapped) != offset + width * height or \
+            (stat is not None and (size, mtime) != (stat.st_size, stat.st_mtime_ns)):
+        mapped.close()
+        return None
+    entities = []
+    for i in range(count):
+        char, col, row = ENTITY_RECORD.unpack_from(mapped, HEADER.size + i * ENTITY_RECORD.size)
+        entities.append((char.decode('ascii'), col, row))
+    return Level(width, height, mapped, entities, offset, mapped)
+
+
+def load_level(path):
+    """Load a level file, compiling it first if there is no up to date binary file."""
+    stat = os.stat(path)
+    level = map_level(path, stat)
+    if level is None:
+        try:
+            compile_level(path)
+        except OSError:
+            # can't write next to the level (read-only install), just use it uncompiled
+            return Level.from_rows(read_rows(path))
+        level = map_level(path, stat)
+    return level
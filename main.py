@@ -1,119 +1,245 @@
-# go to terminal (@ bottom of screen) and write "pip install pygame" after PS C: line
+# go to terminal (@ bottom of screen) and write "pip install pygame numpy" after PS C: line
+import argparse
+import os
+import time
+
 import pygame
 import sprites
+from profiler import NULL_PROFILER, FrameProfiler
+from render import HUD, DirtyRects, text_cache
+from replay import InputRecorder
 from settings import *
 
 ###############################################################################
 ###############################################################################
-
-pygame.init()
-player_group = pygame.sprite.Group()
-layout_group = pygame.sprite.Group()
-layout = sprites.Layout(TILE_SIZE)
-layout_list = layout.get_layout()
-layout_group.add(layout)
+# importing this file does nothing, the game starts in main()
 
 
-def start_screen():
-    # beginning screen
-    screen = pygame.display.set_mode((WIN_WIDTH, WIN_HEIGHT))
+def start_screen(screen, clock, load=None):
+    """Beginning screen. If load is given it is called once the screen is showing, so the
+    level loads while the player reads it, and its result is returned. Returns None if the
+    player quits instead.
+    """
     pygame.display.set_caption("Start Screen")
-    clock = pygame.time.Clock()
 
     # press space to move on to level 1
     start_text1 = 'press space key to begin'
     start_text2 = 'or Q to quit'
-    directions = 'avoid the green algae and reach the exit to win'
-    font_1 = pygame.font.SysFont('Arial', 30, True, False)
-    font = pygame.font.SysFont('Arial', 15, True, False)
-    text1 = font_1.render(start_text1, True, LIME)
-    text2 = font_1.render(start_text2, True, LIME)
-    direct = font.render(directions, True, RED)
+    if SHARKS_BITE:
+        directions = 'avoid the green algae and the sharks, reach the exit to win'
+    else:
+        directions = 'avoid the green algae and reach the exit to win'
+    text1 = text_cache.render(start_text1, LIME, 30)
+    text2 = text_cache.render(start_text2, LIME, 30)
+    direct = text_cache.render(directions, RED, 15)
+
+    # nothing moves here, so the screen is drawn once and only sent again if the window needs it
+    dirty = DirtyRects()
+    screen.fill(BG)
+    screen.blit(text1, [80, 200])
+    screen.blit(text2, [150, 300])
+    screen.blit(direct, [100, 600])
+    dirty.present()
+
+    loaded = None
+    if load is not None:
+        loaded = load()
 
     playing = True
     while playing:
         for event in pygame.event.get():
+            dirty.handle_event(event)
             if event.type == pygame.QUIT:
-                quit()
+                return None
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_SPACE:
                     playing = False
                 elif event.key == pygame.K_q:
-                    quit()
-        screen.fill(BG)
-
-        screen.blit(text1, [80, 200])
-        screen.blit(text2, [150, 300])
-        screen.blit(direct, [100, 600])
+                    return None
 
-        pygame.display.flip()
+        dirty.present()
         clock.tick(FPS)
 
+    return loaded
+
+
+def game(level_layout, read_keys=None, max_frames=None, realtime=True, frame_times=None, profiler=None,
+         screen=None, clock=None):
+    """Play level_layout until the player quits, reaches the exit or is caught by a shark
+    (with SHARKS_BITE), returns True if the exit was reached.
+    Tools can pass their own read_keys function, stop after max_frames, and with
+    realtime=False run exactly one step per frame with no frame rate limit. The time taken by
+    each frame is appended to frame_times if it is given, and a FrameProfiler times each
+    phase of the frame. screen and clock default to the open window and a new clock.
+    """
+    if read_keys is None:
+        read_keys = pygame.key.get_pressed
+    if profiler is None:
+        profiler = NULL_PROFILER
+    level_layout.profiler = profiler
+    if screen is None:
+        screen = pygame.display.get_surface()
+    if clock is None:
+        clock = pygame.time.Clock()
 
-def game():
-    screen = pygame.display.set_mode((WIN_WIDTH, WIN_HEIGHT))
     pygame.display.set_caption("Final Game")
 
     # sprite groups
     all_sprites = pygame.sprite.Group()
+    hud = HUD()
+    # drawn over the level every frame, the level clears them before it scrolls
+    overlays = [hud.rect]
+    if profiler.enabled:
+        overlays.append(profiler.overlay_rect)
 
     playing = True
 
-    clock = pygame.time.Clock()
+    dirty = DirtyRects()
+    # the previous screen left other things on the display, start from a full redraw
+    level_layout.drawn_camera_y = None
+    # real time that has passed but not been simulated yet
+    accumulator = 0.0
+    frames = 0
+    frame_start = time.perf_counter()
 
     while playing:
-        clock.tick(FPS)
+        if realtime:
+            accumulator += min(clock.tick(FPS) / 1000, MAX_FRAME_TIME)
+        else:
+            clock.tick()
+            accumulator = STEP_TIME
+        profiler.mark('sleep')
         for event in pygame.event.get():
+            dirty.handle_event(event)
+            profiler.handle_event(event)
             if event.type == pygame.QUIT:
                 playing = False
             if event.type == pygame.KEYDOWN:  # allow for q key to quit the game
                 if event.key == pygame.K_q:
                     playing = False
-
-        screen.fill(BG)
-        # maybe a gradient look as the player moves lower into the level for BG color?
-        all_sprites.update()
-        layout_group.update()
-
-        pygame.display.flip()
-
-
-def game_over():
-    screen = pygame.display.set_mode((WIN_WIDTH, WIN_HEIGHT))
-    clock = pygame.time.Clock()
-
+                elif event.key == pygame.K_F3 and profiler.enabled:
+                    # the overlay came or went, redraw everything under it
+                    level_layout.drawn_camera_y = None
+        profiler.mark('events')
+
+        # simulate in fixed steps, as many as the elapsed time calls for
+        while accumulator >= STEP_TIME:
+            all_sprites.update()
+            level_layout.update(read_keys())
+            accumulator -= STEP_TIME
+        # then draw once, in between the last two steps
+        level_layout.draw(screen, dirty, accumulator / STEP_TIME, overlays)
+        hud.set('depth', level_layout.player.rect.y // TILE_SIZE)
+        hud.set('time', level_layout.player.steps // SIM_RATE)
+        hud.draw(screen, dirty)
+        profiler.draw(screen, dirty)
+        profiler.mark('overlay')
+
+        dirty.present()
+        profiler.mark('present')
+        profiler.end_frame()
+
+        if frame_times is not None:
+            now = time.perf_counter()
+            frame_times.append(now - frame_start)
+            frame_start = now
+        frames += 1
+        if level_layout.won or level_layout.lost or frames == max_frames:
+            playing = False
+
+    return level_layout.won
+
+
+def game_over(screen, clock):
+    """Game over screen, returns True to play again and False to quit."""
     text1 = 'press space to play again'
     text2 = 'or press Q to quit'
-    font_1 = pygame.font.SysFont('Arial', 30, True, False)
-    text1 = font_1.render(text1, True, LIME)
-    text2 = font_1.render(text2, True, RED)
+    text1 = text_cache.render(text1, LIME, 30)
+    text2 = text_cache.render(text2, RED, 30)
+
+    dirty = DirtyRects()
+    screen.fill(BG)
+    screen.blit(text1, [80, 200])
+    screen.blit(text2, [80, 400])
 
     playing = True
     while playing:
         for event in pygame.event.get():
+            dirty.handle_event(event)
             if event.type == pygame.QUIT:
-                quit()
+                return False
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_SPACE:
                     playing = False
                 elif event.key == pygame.K_q:
-                    quit()
-        screen.fill(BG)
-
-        screen.blit(text1, [80, 200])
-        screen.blit(text2, [80, 400])
+                    return False
 
-        pygame.display.flip()
+        dirty.present()
 
         clock.tick(FPS)
 
+    return True
+
+
+class SceneRunner:
+    # owns the one window and clock and moves between the start, play and game over scenes,
+    # each scene runs until it returns the name of the next one, or None to quit
+    def __init__(self, screen, profiler=None, record=None):
+        self.screen = screen
+        self.clock = pygame.time.Clock()
+        self.profiler = profiler
+        self.record = record
+        self.attempt = 1
+        # built by the start scene, then reset in place for every new attempt
+        self.layout = None
+        self.scenes = {'start': self.start, 'play': self.play, 'game_over': self.game_over}
+
+    def run(self, scene='start'):
+        while scene is not None:
+            scene = self.scenes[scene]()
+
+    def start(self):
+        self.layout = start_screen(self.screen, self.clock, lambda: sprites.Layout(TILE_SIZE))
+        return None if self.layout is None else 'play'
+
+    def play(self):
+        recorder = None
+        if self.record:
+            recorder = InputRecorder(self.layout, LEVEL_FILE)
+        won = game(self.layout, recorder, profiler=self.profiler, screen=self.screen, clock=self.clock)
+        if recorder is not None:
+            path, ext = os.path.splitext(self.record)
+            recorder.save(self.record if self.attempt == 1 else f"{path}-{self.attempt}{ext}")
+        # reaching the exit ends the game
+        return None if won else 'game_over'
+
+    def game_over(self):
+        if not game_over(self.screen, self.clock):
+            return None
+        # start the level over
+        self.attempt += 1
+        self.layout.reset()
+        return 'play'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Final Game")
+    parser.add_argument('--profile', action='store_true',
+                        help="time each part of the frame (F3 shows the overlay, F4 saves a trace)")
+    parser.add_argument('--record', metavar='FILE',
+                        help="record the keys of each attempt for replay.py (FILE, FILE-2, ...)")
+    args = parser.parse_args()
+    profiler = FrameProfiler() if args.profile else None
+
+    # the window opens here, once, and the level is built lazily, never when a module is imported
+    pygame.init()
+    screen = pygame.display.set_mode((WIN_WIDTH, WIN_HEIGHT))
+    SceneRunner(screen, profiler, args.record).run()
+    pygame.quit()
 
-start_screen()
-while True:
-    game()
-    game_over()
 
-pygame.quit()
+if __name__ == '__main__':
+    main()
 
 
 
@@ -0,0 +1,286 @@
+# where the player can get to in a level, as a graph of the tiles it can stand on
+# check a level with: python navigation.py levels/level_1.txt
+#
+# Nodes are (column, row) cells the diver fits in with rock, algae or the exit right below.
+# Edges are the moves Player.update allows, worked out from the physics settings:
+#   walk  to the next cell in the same row
+#   jump  across a gap to a cell in reach of one jump (a jump rises less than a tile, so it
+#         never reaches a higher row with the current settings)
+#   fall  off an edge, landing wherever the diver can steer to on the way down
+# The graph is built once per level, reachability and paths are cached after the first query.
+import argparse
+from collections import OrderedDict, deque
+
+import numpy as np
+import atlas
+from levels import load_level
+from settings import *
+
+WALK = 0
+JUMP = 1
+FALL = 2
+EDGE_NAMES = ['walk', 'jump', 'fall']
+
+# cells the diver passes through, everything else collides
+OPEN = b'0Pe'
+# columns the diver can be in, Player.update keeps it inside the window
+PLAY_COLUMNS = WIN_WIDTH // TILE_SIZE
+# size of the diver, from its standing image
+PLAYER_WIDTH, PLAYER_HEIGHT = atlas.REGIONS['diver_stand_right'][1][2:]
+# how many paths a graph keeps
+PATH_CACHE_SIZE = 256
+
+
+def jump_arc():
+    """(rise in pixels, steps in the air) of a jump from the ground, stepped like Player.update:
+    the jump moves -JUMP_SPEED once, gravity adds to the velocity every step up to
+    TERMINAL_VELOCITY, and the jump is over once the diver is back at the height it left from.
+    """
+    y = 0
+    velocity = GRAVITY
+    y -= JUMP_SPEED - velocity
+    rise = -y
+    steps = 1
+    while y < 0:
+        velocity = min(velocity + GRAVITY, TERMINAL_VELOCITY)
+        y += velocity
+        steps += 1
+    return max(rise, 0), steps
+
+
+JUMP_RISE, JUMP_STEPS = jump_arc()
+# rows a jump climbs, 0 with the stock settings
+JUMP_ROWS = JUMP_RISE // TILE_SIZE
+# gap in columns a jump clears: the diver can leave with only a pixel on the edge and land
+# with only a pixel on the other side
+JUMP_COLUMNS = (JUMP_STEPS * RUN_SPEED + PLAYER_WIDTH - 2) // TILE_SIZE
+# columns the diver can steer sideways for each row it falls
+FALL_DRIFT = RUN_SPEED // TERMINAL_VELOCITY
+
+
+def cells_tall(height):
+    """Rows of cells a body height pixels tall covers when its feet are on a cell's bottom edge."""
+    return -(-height // TILE_SIZE)
+
+
+class NavGraph:
+    # standable cells of a level and the moves between them
+    def __init__(self, level):
+        self.level = level
+        width = min(level.width, PLAY_COLUMNS)
+        self.width = width
+        self.height = level.height
+        cells = np.frombuffer(level.cells, dtype=np.uint8, count=level.width * level.height,
+                              offset=level.offset).reshape(level.height, level.width)[:, :width]
+        is_open = np.isin(cells, np.frombuffer(OPEN, dtype=np.uint8))
+        # True where the diver fits with its feet in the cell, rows above the level are open
+        self.fits = self.clearance(is_open, cells_tall(PLAYER_HEIGHT))
+        self.jump_fits = self.clearance(is_open, cells_tall(PLAYER_HEIGHT + JUMP_RISE))
+        below = np.zeros_like(is_open)
+        below[:-1] = ~is_open[1:]
+        standable = self.fits & below
+        # and every row as an int with a bit per column, for falling through whole rows at once
+        self.fits_rows = self.row_bits(self.fits)
+        self.standable_rows = self.row_bits(standable)
+        # numpy is quick to build these but slow to read one cell at a time,
+        # the graph is built from flat bytes indexed by row * width + column
+        self.fits = self.fits.tobytes()
+        self.jump_fits = self.jump_fits.tobytes()
+        self.standable = standable.tobytes()
+
+        # node -> [(node, kind)]
+        self.edges = {}
+        self.falls = {}
+        for row, col in zip(*np.nonzero(standable)):
+            node = (int(col), int(row))
+            self.edges[node] = self.moves(*node)
+
+        self.start = None
+        self.exit = None
+        for char, col, row in level.entities:
+            if char == 'P':
+                self.start = (col, row) if self.is_node(col, row) else self.land(col, row)
+            elif char == 'D':
+                # Layout.update wins when the diver's right side touches the door's left side
+                self.exit = (col - 1, row)
+        self.reached = {}
+        self.paths = OrderedDict()
+
+    @staticmethod
+    def clearance(is_open, rows):
+        """True where the cell and the rows - 1 cells above it are open."""
+        fits = is_open.copy()
+        for k in range(1, rows):
+            fits[k:] &= is_open[:-k]
+        return fits
+
+    @staticmethod
+    def row_bits(mask):
+        """Each row of a boolean array as an int, bit c set where column c is True."""
+        packed = np.packbits(mask, axis=1, bitorder='little')
+        stride = packed.shape[1]
+        data = packed.tobytes()
+        return [int.from_bytes(data[i:i + stride], 'little') for i in range(0, len(data), stride)]
+
+    def __len__(self):
+        return len(self.edges)
+
+    def is_node(self, col, row):
+        return 0 <= col < self.width and 0 <= row < self.height and bool(self.standable[row * self.width + col])
+
+    def moves(self, col, row):
+        """The walk, jump and fall edges out of a standable cell."""
+        edges = []
+        for side in (-1, 1):
+            nxt = col + side
+            if not 0 <= nxt < self.width or not self.fits[row * self.width + nxt]:
+                continue
+            if self.standable[row * self.width + nxt]:
+                edges.append(((nxt, row), WALK))
+            else:
+                # walked off the edge, or jumped over the gap
+                edges.extend((node, FALL) for node in self.fall(nxt, row))
+                edges.extend((node, JUMP) for node in self.jumps(col, row, side))
+        return edges
+
+    def jumps(self, col, row, side):
+        """Standable cells across a gap within one jump of (col, row), going towards side."""
+        width = self.width
+        found = []
+        for up in range(JUMP_ROWS + 1):
+            target_row = row - up
+            if target_row < 0:
+                break
+            for distance in range(1, JUMP_COLUMNS + 2):
+                target = col + side * distance
+                # the whole arc has to be clear
+                if not 0 <= target < width or not self.jump_fits[row * width + target] \
+                        or not self.jump_fits[target_row * width + target]:
+                    break
+                if self.standable[target_row * width + target]:
+                    found.append((target, target_row))
+                    break
+        return found
+
+    def fall(self, col, row):
+        """Standable cells the diver can land on after dropping off into (col, row)."""
+        key = (col, row)
+        landed = self.falls.get(key)
+        if landed is not None:
+            return landed
+        landed = []
+        # columns the diver can be in, as bits, row by row on the way down
+        air = 1 << col
+        for i in range(row, self.height):
+            landing = air & self.standable_rows[i]
+            while landing:
+                bit = landing & -landing
+                landed.append((bit.bit_length() - 1, i))
+                landing ^= bit
+            air &= ~self.standable_rows[i]
+            if not air or i + 1 >= self.height:
+                break
+            # steer sideways through cells the diver fits in, then drop into the next row
+            for step in range(FALL_DRIFT):
+                air = (air | air << 1 | air >> 1) & self.fits_rows[i]
+            air &= self.fits_rows[i + 1]
+        self.falls[key] = landed
+        return landed
+
+    def land(self, col, row):
+        """Where the diver first lands when it starts in the air at (col, row) and drops straight."""
+        for i in range(row, self.height):
+            if not self.fits[i * self.width + col]:
+                return None
+            if self.standable[i * self.width + col]:
+                return (col, i)
+        return None
+
+    def node_at(self, rect):
+        """The node a world rect (of the diver) stands on, or None in the air."""
+        node = (rect.centerx // TILE_SIZE, (rect.bottom - 1) // TILE_SIZE)
+        return node if node in self.edges else None
+
+    def reachable(self, start=None):
+        """Every node that can be reached from start (default the player start)."""
+        if start is None:
+            start = self.start
+        reached = self.reached.get(start)
+        if reached is None:
+            seen = {start} if start in self.edges else set()
+            todo = deque(seen)
+            while todo:
+                for node, kind in self.edges[todo.popleft()]:
+                    if node not in seen:
+                        seen.add(node)
+                        todo.append(node)
+            reached = frozenset(seen)
+            self.reached[start] = reached
+        return reached
+
+    def can_reach(self, goal=None, start=None):
+        """True if goal (default the exit) can be reached from start (default the player start)."""
+        if goal is None:
+            goal = self.exit
+        return goal in self.reachable(start)
+
+    def path(self, start, goal):
+        """Fewest-move list of (node, kind) from start to goal, or None if there is none.
+        The kind is the move that gets to the node, the first entry is (start, None).
+        Paths are cached, so enemies can ask every frame without searching every frame.
+        """
+        key = (start, goal)
+        try:
+            self.paths.move_to_end(key)
+            return self.paths[key]
+        except KeyError:
+            pass
+        path = None
+        if start in self.edges and goal in self.edges:
+            # node -> (node it was reached from, move)
+            came = {start: (None, None)}
+            todo = deque([start])
+            while todo:
+                node = todo.popleft()
+                if node == goal:
+                    path = [(goal, came[goal][1])]
+                    while came[node][0] is not None:
+                        node = came[node][0]
+                        path.append((node, came[node][1]))
+                    path.reverse()
+                    break
+                for nxt, kind in self.edges[node]:
+                    if nxt not in came:
+                        came[nxt] = (node, kind)
+                        todo.append(nxt)
+        self.paths[key] = path
+        while len(self.paths) > PATH_CACHE_SIZE:
+            self.paths.popitem(last=False)
+        return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the exit of levels can be reached.")
+    parser.add_argument('levels', nargs='+', help="level files")
+    args = parser.parse_args()
+    print(f"jump: rises {JUMP_RISE}px over {JUMP_STEPS} steps, clears {JUMP_COLUMNS} column gaps, "
+          f"climbs {JUMP_ROWS} rows; falling steers {FALL_DRIFT} column per row")
+    failed = False
+    for path in args.levels:
+        graph = NavGraph(load_level(path))
+        counts = [0, 0, 0]
+        for edges in graph.edges.values():
+            for node, kind in edges:
+                counts[kind] += 1
+        route = graph.path(graph.start, graph.exit)
+        moves = ', '.join(f"{count} {name}" for name, count in zip(EDGE_NAMES, counts))
+        if route is None:
+            failed = True
+            print(f"{path}: exit {graph.exit} can NOT be reached, {len(graph)} nodes, {moves}")
+        else:
+            print(f"{path}: exit reachable in {len(route) - 1} moves, {len(graph)} nodes, {moves}")
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+import csv
+import json
+import time
+from array import array
+
+import pygame
+from settings import *
+
+# the parts of a game() frame that get timed, in the order they run. 'sleep' is the frame
+# limiter waiting for the next frame, it is kept apart from the work the frame did
+PHASES = ['sleep', 'events', 'player', 'sharks', 'draw_level', 'draw_sprites', 'overlay', 'present']
+SLEEP = PHASES.index('sleep')
+PHASE_COLORS = [(90, 90, 90), (200, 200, 200), LIME, PURPLE, YELLOW, (80, 170, 255), WHITE, RED]
+
+
+def work_time(times):
+    """Time of a frame's phases without the sleep."""
+    return sum(times) - times[SLEEP]
+
+
+class NullProfiler:
+    # stands in when profiling is off, every call does nothing
+    enabled = False
+
+    def mark(self, phase):
+        pass
+
+    def end_frame(self):
+        pass
+
+    def handle_event(self, event):
+        pass
+
+    def draw(self, surface, dirty=None):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class FrameProfiler:
+    # times each phase of the game() loop into a ring buffer of the last few seconds of frames
+    enabled = True
+
+    def __init__(self, size=PROFILE_FRAMES):
+        self.size = size
+        # one column of frame times per phase, in seconds
+        self.samples = [array('d', bytes(8 * size)) for phase in PHASES]
+        self.phase_index = {phase: i for i, phase in enumerate(PHASES)}
+        self.current = [0.0] * len(PHASES)
+        self.frames = 0
+        self.last = time.perf_counter()
+        self.overlay = False
+        self.font = None
+        self.overlay_rect = pygame.Rect(5, 5, 230, 165)
+
+    def mark(self, phase):
+        """Add the time since the last mark to phase, a phase may be marked several times a frame."""
+        now = time.perf_counter()
+        self.current[self.phase_index[phase]] += now - self.last
+        self.last = now
+
+    def end_frame(self):
+        """Store the frame just timed in the ring buffer and start the next one."""
+        slot = self.frames % self.size
+        for column, value in zip(self.samples, self.current):
+            column[slot] = value
+        self.current = [0.0] * len(PHASES)
+        self.frames += 1
+
+    def recorded(self):
+        """(frame number, [phase times]) of the frames in the buffer, oldest first."""
+        first = max(self.frames - self.size, 0)
+        for frame in range(first, self.frames):
+            slot = frame % self.size
+            yield frame, [column[slot] for column in self.samples]
+
+    def dump(self, path):
+        """Write the buffer to path, as CSV if it ends in .csv, as JSON otherwise (times in ms).
+        total is the work of the frame, every phase but sleep.
+        """
+        if path.endswith('.csv'):
+            with open(path, 'w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(['frame'] + PHASES + ['total'])
+                for frame, times in self.recorded():
+                    writer.writerow([frame] + [f"{t * 1000:.4f}" for t in times] +
+                                    [f"{work_time(times) * 1000:.4f}"])
+        else:
+            frames = [dict(frame=frame, total=work_time(times) * 1000,
+                           **{phase: t * 1000 for phase, t in zip(PHASES, times)})
+                      for frame, times in self.recorded()]
+            with open(path, 'w') as file:
+                json.dump({'phases': PHASES, 'unit': 'ms', 'frames': frames}, file, indent=1)
+        return path
+
+    def handle_event(self, event):
+        # F3 shows/hides the overlay, F4 saves the buffer
+        if event.type != pygame.KEYDOWN:
+            return
+        if event.key == pygame.K_F3:
+            self.overlay = not self.overlay
+        elif event.key == pygame.K_F4:
+            stamp = time.strftime('%Y%m%d-%H%M%S')
+            self.dump(f'profile-{stamp}.json')
+            self.dump(f'profile-{stamp}.csv')
+
+    def draw(self, surface, dirty=None):
+        """Draw the overlay: a graph of the work time of recent frames and the average time of
+        each phase. Sleep is listed but has no bar, it is whatever the work leaves of the frame.
+        """
+        if not self.overlay:
+            return
+        if self.font is None:
+            self.font = pygame.font.Font(None, 16)
+        box = self.overlay_rect
+        surface.fill(BLACK, box)
+
+        # work time graph, the line is the budget of one step
+        graph = pygame.Rect(box.x + 5, box.y + 5, box.width - 10, 50)
+        scale = graph.height / (2 * STEP_TIME)
+        count = min(self.frames, graph.width)
+        for i in range(count):
+            frame = self.frames - count + i
+            slot = frame % self.size
+            total = work_time([column[slot] for column in self.samples])
+            height = min(int(total * scale), graph.height)
+            x = graph.x + graph.width - count + i
+            surface.fill(RED if total > STEP_TIME else LIME, (x, graph.bottom - height, 1, height))
+        surface.fill(WHITE, (graph.x, graph.bottom - int(STEP_TIME * scale), graph.width, 1))
+
+        # average of each phase over the last second
+        recent = min(self.frames, self.size, SIM_RATE)
+        y = graph.bottom + 6
+        for i, phase in enumerate(PHASES):
+            column = self.samples[i]
+            average = sum(column[(self.frames - 1 - k) % self.size] for k in range(recent)) / max(recent, 1)
+            width = min(int(average * scale * 2), box.width - 115)
+            label = self.font.render(f"{phase} {average * 1000:.2f}", True, WHITE)
+            surface.blit(label, (box.x + 5, y))
+            if i != SLEEP:
+                surface.fill(PHASE_COLORS[i], (box.x + 110, y + 2, width, 8))
+            y += 12
+        if dirty is not None:
+            dirty.add(box)
@@ -0,0 +1,117 @@
+import os
+from collections import OrderedDict
+
+import pygame
+from settings import *
+
+
+def init_headless():
+    """Set up pygame without a window or sound, for tools and workers that draw nothing on screen.
+    Does nothing if a display is already open.
+    """
+    if pygame.display.get_surface() is not None:
+        return
+    # this has to happen before pygame is initialised
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    pygame.init()
+    # images are converted to the display format, so there has to be one
+    pygame.display.set_mode((WIN_WIDTH, WIN_HEIGHT))
+
+
+class DirtyRects:
+    # keeps track of the parts of the screen that changed since the last present()
+    def __init__(self, enabled=DIRTY_RECTS):
+        self.enabled = enabled
+        self.rects = []
+        self.full = True
+
+    def add(self, rect):
+        """Mark one screen region as changed."""
+        self.rects.append(pygame.Rect(rect))
+
+    def add_all(self):
+        """Mark the whole screen as changed."""
+        self.full = True
+
+    def handle_event(self, event):
+        # the window contents were lost (uncovered, restored, ...), so send everything again
+        if event.type == pygame.VIDEOEXPOSE:
+            self.add_all()
+
+    def present(self):
+        """Push the changed regions to the display, or nothing if none changed."""
+        if not self.enabled:
+            pygame.display.flip()
+        elif self.full:
+            pygame.display.flip()
+        elif self.rects:
+            pygame.display.update(self.rects)
+        self.rects = []
+        self.full = False
+
+
+class TextCache:
+    # fonts and rendered text, so menus and the HUD don't look up fonts or render the same
+    # text again every time they are shown
+    def __init__(self, max_texts):
+        self.max_texts = max_texts
+        # (name, size, bold, italic) -> Font, there are only ever a handful
+        self.fonts = {}
+        # least recently used text surfaces are at the front
+        self.texts = OrderedDict()
+
+    def font(self, name, size, bold=False, italic=False):
+        """pygame.font.SysFont, which scans the system fonts, called once per font."""
+        key = (name, size, bold, italic)
+        font = self.fonts.get(key)
+        if font is None:
+            font = pygame.font.SysFont(name, size, bold, italic)
+            self.fonts[key] = font
+        return font
+
+    def render(self, text, color, size, name='Arial', bold=True, italic=False):
+        """Rendered, antialiased text. The surface is shared, so it must not be drawn on."""
+        key = (name, size, bold, italic, text, tuple(color))
+        try:
+            self.texts.move_to_end(key)
+            return self.texts[key]
+        except KeyError:
+            pass
+        surface = self.font(name, size, bold, italic).render(text, True, color)
+        self.texts[key] = surface
+        while len(self.texts) > self.max_texts:
+            self.texts.popitem(last=False)
+        return surface
+
+
+text_cache = TextCache(TEXT_CACHE_SIZE)
+
+
+class HUD:
+    # panel of values shown during play, only re-rendered when one of them changes
+    def __init__(self, topleft=(WIN_WIDTH - 135, 5), size=(130, 24)):
+        self.rect = pygame.Rect(topleft, size)
+        self.panel = pygame.Surface(size)
+        self.values = {}
+        self.shown = None
+
+    def set(self, name, value):
+        self.values[name] = value
+
+    def draw(self, surface, dirty=None):
+        """Draw the panel. Only redraws and reports it to dirty when a value changed, it is still
+        blitted every frame so whatever the level draws underneath never covers it.
+        """
+        shown = tuple(self.values.items())
+        if shown != self.shown:
+            self.shown = shown
+            self.panel.fill(BLACK)
+            x = 5
+            for name, value in shown:
+                text = text_cache.render(f"{name} {value}", WHITE, 15)
+                self.panel.blit(text, (x, (self.rect.height - text.get_height()) // 2))
+                x += text.get_width() + 10
+            if dirty is not None:
+                dirty.add(self.rect)
+        surface.blit(self.panel, self.rect)
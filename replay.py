@@ -0,0 +1,112 @@
+# record a play session and replay it headless at full speed
+# record with: python main.py --record session.json
+# replay with: python replay.py session.json
+import argparse
+import json
+import time
+import zlib
+
+import pygame
+import sprites
+from controls import KEY_STATES, key_mask
+from levels import load_level
+from render import init_headless
+from settings import *
+
+# the recorded level state is compared every this many steps (and after the last one)
+CHECK_STEPS = 10
+
+
+def level_state(layout):
+    """What a replay has to match: player position, camera, outcome and a CRC of the sharks."""
+    return [layout.player.rect.x, layout.player.rect.y, layout.camera.y,
+            int(layout.won), int(layout.lost), zlib.crc32(layout.sharks.x.tobytes())]
+
+
+class InputRecorder:
+    # used as game()'s read_keys: reads the keyboard and remembers the keys of every step,
+    # plus the level state every CHECK_STEPS steps
+    def __init__(self, layout, level_file, read_keys=None):
+        self.layout = layout
+        self.level_file = level_file
+        self.read_keys = read_keys or pygame.key.get_pressed
+        # one key mask per step, see controls.key_mask
+        self.keys = bytearray()
+        # [step, state...] with state from level_state(), after that many steps
+        self.checks = []
+
+    def __call__(self):
+        steps = len(self.keys)
+        if steps and steps % CHECK_STEPS == 0:
+            # state after the step just simulated
+            self.checks.append([steps] + level_state(self.layout))
+        mask = key_mask(self.read_keys())
+        self.keys.append(mask)
+        # play exactly what gets recorded
+        return KEY_STATES[mask]
+
+    def save(self, path):
+        checks = self.checks
+        if not checks or checks[-1][0] != len(self.keys):
+            checks = checks + [[len(self.keys)] + level_state(self.layout)]
+        recording = {
+            'level': self.level_file,
+            'level_crc': self.layout.level.checksum(),
+            'sim_rate': SIM_RATE,
+            # one hex digit per step
+            'keys': self.keys.hex()[1::2],
+            'checks': checks,
+        }
+        with open(path, 'w') as file:
+            json.dump(recording, file)
+
+
+def replay(recording):
+    """Run a recording through Layout.update as fast as possible.
+    Returns (steps, seconds, mismatches) where mismatches lists (step, recorded, replayed).
+    """
+    if recording['sim_rate'] != SIM_RATE:
+        raise ValueError(f"recorded at SIM_RATE {recording['sim_rate']}, the game runs at {SIM_RATE}")
+    level = load_level(recording['level'])
+    if level.checksum() != recording['level_crc']:
+        raise ValueError(f"{recording['level']} has changed since the recording was made")
+    layout = sprites.Layout(TILE_SIZE, level)
+    keys = [KEY_STATES[int(digit, 16)] for digit in recording['keys']]
+    checks = {check[0]: check[1:] for check in recording['checks']}
+
+    mismatches = []
+    start = time.perf_counter()
+    for step, state in enumerate(keys, 1):
+        layout.update(state)
+        if step in checks:
+            replayed = level_state(layout)
+            if replayed != checks[step]:
+                mismatches.append((step, checks[step], replayed))
+    return len(keys), time.perf_counter() - start, mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded sessions headless and check them.")
+    parser.add_argument('recordings', nargs='+', help="files made with python main.py --record")
+    args = parser.parse_args()
+
+    init_headless()
+    failed = False
+    for path in args.recordings:
+        with open(path) as file:
+            recording = json.load(file)
+        steps, seconds, mismatches = replay(recording)
+        rate = steps / seconds if seconds else float('inf')
+        if mismatches:
+            failed = True
+            step, recorded, replayed = mismatches[0]
+            print(f"{path}: MISMATCH at step {step} of {steps}, recorded {recorded}, replayed {replayed} "
+                  f"({len(mismatches)} checks differ)")
+        else:
+            print(f"{path}: ok, {steps} steps in {seconds:.3f}s ({rate:.0f} steps/s)")
+    pygame.quit()
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,68 +1,49 @@
-import pygame
-
-# Constants
+# Constants, importing this file has no side effects (no window is opened here)
 BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
 YELLOW = (214, 146, 0)
 GREEN = (60, 92, 0)
 PURPLE = (215, 135, 255)
 BG = (15, 55, 90)
+# the water fades from BG at the top of a level to this at the bottom
+BG_DEEP = (2, 10, 28)
 LIME = (181, 230, 29)
 RED = (221, 28, 1)
 
 
 FPS = 60
+# the simulation always advances in fixed steps of STEP_TIME seconds, whatever the frame rate
+SIM_RATE = 60
+STEP_TIME = 1 / SIM_RATE
+# longest frame the simulation catches up on, so one stall does not snowball
+MAX_FRAME_TIME = 0.25
+# animation frames change every 100 ms
+ANIMATION_DELAY = SIM_RATE // 10
+# only push the changed parts of the screen to the display (False = full flip every frame)
+DIRTY_RECTS = True
 
 WIN_WIDTH = 500
 WIN_HEIGHT = 900
-SCREEN = pygame.display.set_mode((WIN_WIDTH, WIN_HEIGHT))
 TILE_SIZE = 25
-# layout = 20x36
-# the column of 1s on the right are now shown in the window, they are just there for collision
-LAYOUT = ['430000000000000000121',
-          '000000000000000000011',
-          '000000000000000000001',
-          '0P0000000000000000001',
-          '424242230000000000001',
-          '000000000000000000001',
-          '000000000000000000001',
-          '001424244244230000001',
-          '000000000000000000001',
-          '000000000abdbc00abdb1',
-          'dbdbbdc00000000000001',
-          '000000000000000000001',
-          '000000000000012422421',
-          '000000000000000000001',
-          '000001244230000000001',
-          '000000000000000000001',
-          '000000000000000000001',
-          '000000000000000000001',
-          '0000000000000abddbdb1',
-          '000000000000000000001',
-          '000000000000000000001',
-          '000000000000000000001',
-          '000000000000000000001',
-          'bddc00000000000000001',
-          '000000000000000000001',
-          '000000000012422bddb21',
-          '000000000000000000001',
-          '000000000000000000001',
-          '000000000000000000001',
-          '000000000000000000001',
-          '000000000000000000001',
-          '000000000000000000001',
-          'e00000000000000000001',
-          '000000000000000000001',
-          '000000400000000000001',
-          '000000000000000000001',  # last line of the visible screen at start of game
-          '000000000000000000001',
-          '000000000000000000001',
-          '000000000000000000001',
-          '000000000000000000001',
-          '000000000000000000001',
-          '000000000000000000001',
-          '000000000000000000001',
-          '000000000000000000001',
-          '0000000000000000000D1',
-          '242244424224424242424']
-
+# player physics, in pixels per simulation step
+RUN_SPEED = 5
+JUMP_SPEED = 15
+GRAVITY = 1
+TERMINAL_VELOCITY = 3
+SCROLL_SPEED = 3
+SHARK_SPEED = 2
+# True makes a shark touching the player end the game (lost), the start screen says so.
+# Off, sharks only swim by, as they always have
+SHARKS_BITE = False
+# how many frames the profiler keeps (python main.py --profile, F3 overlay, F4 save)
+PROFILE_FRAMES = 600
+# how many decoded sheets and cut-out images the asset cache keeps
+ASSET_CACHE_SIZE = 256
+# how many rendered texts the text cache keeps
+TEXT_CACHE_SIZE = 128
+# static tiles are pre-rendered in bands of this many rows (one screen tall)
+CHUNK_ROWS = WIN_HEIGHT // TILE_SIZE
+# bands of tiles kept ready above and below the view, the rest of the level has no tiles
+STREAM_BANDS = 1
+# the level played by default, see levels.py for the file format
+LEVEL_FILE = 'levels/level_1.txt'
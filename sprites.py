@@ -1,7 +1,116 @@
+import re
+from collections import OrderedDict
+
+import numpy as np
 import pygame
+import atlas
+from enemies import SharkSwarm
+from levels import Level, load_level
+from navigation import NavGraph
+from profiler import NULL_PROFILER
 from settings import *
 
 
+# collision kinds stored in the collision grid
+SOLID = 0
+ENEMY = 1
+DOOR = 2
+
+# runs of rock tiles, and algae and the exit on their own. Algae stay one rect per tile: a
+# tile pushing the player back is followed by a test of the next tile against the pushed dx
+TILE_RUN = re.compile(b'[1-4]+|[a-d]|D')
+RUN_KINDS = {ord('D'): DOOR}
+RUN_KINDS.update((char, SOLID) for char in b'1234')
+RUN_KINDS.update((char, ENEMY) for char in b'abcd')
+
+# a tile is stored as nothing but its byte in the level's cells, which indexes Layout.palette
+DOOR_ID = ord('D')
+# tile bytes as regex classes, to find them without a Python loop over the water
+ANY_TILE = re.compile(b'[1-4a-dD]')
+SOLID_TILE = re.compile(b'[1-4D]')
+ENEMY_TILE = re.compile(b'[a-d]')
+
+
+def merge_collision_rects(level, size, first=0, last=None):
+    """Merge the rock tiles of rows first to last (exclusive, default the end) into few
+    collision rects, returns a list of (rect, kind).
+    Rocks next to each other in a row become one rect. Rows are not merged with each other,
+    a player pushed inside a rock is moved out one row of tiles at a time as before.
+    """
+    if last is None or last > level.height:
+        last = level.height
+    rects = []
+    for i in range(first, last):
+        for start, end, chars in level.row_matches(TILE_RUN, i):
+            rect = pygame.Rect(start * size, i * size, (end - start) * size, size)
+            rects.append((rect, RUN_KINDS[chars[0]]))
+    return rects
+
+
+class CollisionGrid:
+    # uniform grid of tile cells, so an entity only checks the tiles next to it
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        # (column, row) -> list of (rect, kind), rects are in world coordinates
+        self.cells = {}
+
+    def add(self, rect, kind):
+        """Register a tile rect, keyed by the cells it covers."""
+        size = self.cell_size
+        entry = (rect, kind)
+        for row in range(rect.top // size, (rect.bottom - 1) // size + 1):
+            for col in range(rect.left // size, (rect.right - 1) // size + 1):
+                self.cells.setdefault((col, row), []).append(entry)
+
+    def remove(self, rect, kind):
+        """Unregister a tile rect added with add()."""
+        size = self.cell_size
+        for row in range(rect.top // size, (rect.bottom - 1) // size + 1):
+            for col in range(rect.left // size, (rect.right - 1) // size + 1):
+                cell = self.cells.get((col, row))
+                if cell is None:
+                    continue
+                cell[:] = [entry for entry in cell if entry[0] is not rect]
+                if not cell:
+                    del self.cells[(col, row)]
+
+    def query(self, rect):
+        """Return the (rect, kind) entries in the cells overlapping rect, each only once."""
+        size = self.cell_size
+        found = []
+        seen = set()
+        for row in range(rect.top // size, (rect.bottom - 1) // size + 1):
+            for col in range(rect.left // size, (rect.right - 1) // size + 1):
+                cell = self.cells.get((col, row))
+                if cell:
+                    # merged rects cover several cells
+                    for entry in cell:
+                        if id(entry) not in seen:
+                            seen.add(id(entry))
+                            found.append(entry)
+        return found
+
+
+class Camera:
+    # vertical scroll offset, everything else stays in world coordinates
+    def __init__(self):
+        # world y shown at the top of the screen
+        self.y = 0
+        # y before the last simulation step
+        self.prev_y = 0
+
+    def scroll(self, dy):
+        # positive dy moves the view down the level
+        self.y += dy
+
+    def to_screen_y(self, world_y):
+        return world_y - self.y
+
+    def view_y(self, alpha):
+        """Camera y blended between the last two steps, alpha=1 is the latest step."""
+        return round(self.prev_y + (self.y - self.prev_y) * alpha)
+
+
 class SpriteSheet:
 
     def __init__(self, filename):
@@ -20,9 +129,9 @@ class SpriteSheet:
         image = pygame.Surface(rect.size).convert()
         image.blit(self.sheet, (0, 0), rect)
         if colorkey is not None:
-            if colorkey is -1:
+            if colorkey == -1:
                 colorkey = image.get_at((0, 0))
-            if colorkey is -2:
+            if colorkey == -2:
                 colorkey = image.get_at((2, 63))
             image.set_colorkey(colorkey, pygame.RLEACCEL)
         return image
@@ -74,13 +183,75 @@ class SpriteSheet:
         return self.images_at(sprite_rects, colorkey)
 
 
+class AssetCache:
+    # process-wide store of decoded sheets and the images cut out of them,
+    # so building another Player/Layout does not decode or scale again
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        # least recently used entries are at the front
+        self.entries = OrderedDict()
+
+    def get(self, key, build):
+        """Return the cached entry for key, calling build() to make it on a miss."""
+        try:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        except KeyError:
+            pass
+        value = build()
+        self.entries[key] = value
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return value
+
+    def sheet(self, filename):
+        """Return the SpriteSheet for filename, decoding the file only once."""
+        return self.get((filename,), lambda: SpriteSheet(filename))
+
+    def image(self, filename, rectangle, colorkey=None, scale=None, flip=(False, False)):
+        """Return a converted image from a sheet, optionally scaled to scale and flipped.
+        The surface is shared between callers, so it must not be drawn on.
+        """
+        key = (filename, tuple(rectangle), colorkey, scale, flip)
+        return self.get(key, lambda: self.load_image(filename, rectangle, colorkey, scale, flip))
+
+    def load_image(self, filename, rectangle, colorkey, scale, flip):
+        image = self.sheet(filename).image_at(rectangle, colorkey)
+        if scale is not None:
+            image = pygame.transform.scale(image, scale)
+        if flip[0] or flip[1]:
+            image = pygame.transform.flip(image, flip[0], flip[1])
+        return image
+
+    def cut(self, name, tile_size=TILE_SIZE):
+        """Cut the named image of atlas.REGIONS out of its sheet, the slow way."""
+        sheet, rectangle, colorkey, scaled = atlas.REGIONS[name]
+        return self.image(sheet, rectangle, colorkey, (tile_size, tile_size) if scaled else None)
+
+    def named(self, name, tile_size=TILE_SIZE):
+        """Return the named image of atlas.REGIONS, from the pre-built atlas when there is one."""
+        return self.get(('named', name, tile_size), lambda: self.load_named(name, tile_size))
+
+    def load_named(self, name, tile_size):
+        loaded = self.get(('atlas', tile_size), lambda: atlas.load_atlas(tile_size))
+        if loaded is None:
+            return self.cut(name, tile_size)
+        surface, regions = loaded
+        return surface.subsurface(regions[name])
+
+    def clear(self):
+        self.entries.clear()
+
+
+asset_cache = AssetCache(ASSET_CACHE_SIZE)
+
+
 class Player(pygame.sprite.Sprite):
-    def __init__(self, x, y, tile_size, tile_set, enemy_tile_set, display):
+    def __init__(self, x, y, tile_size, collision_grid, camera):
         pygame.sprite.Sprite.__init__(self)
         self.tile_size = tile_size
-        self.tile_set = tile_set
-        self.enemy_tile_set = enemy_tile_set
-        self.display = display
+        self.collision_grid = collision_grid
+        self.camera = camera
         self.run_right_list = []
         self.run_left_list = []
         self.stand_left = None
@@ -89,8 +260,12 @@ class Player(pygame.sprite.Sprite):
         self.rect = self.image.get_rect()
         self.rect.x = x
         self.rect.y = y
-        self.last = pygame.time.get_ticks()
-        self.delay = 100
+        # position before the last step, for drawing in between steps
+        self.prev_pos = self.rect.topleft
+        # animation runs on simulation steps, not on the wall clock
+        self.steps = 0
+        self.delay = ANIMATION_DELAY
+        self.last = -self.delay
         self.current_frame = 0
         self.right = True
         self.left = False
@@ -100,17 +275,22 @@ class Player(pygame.sprite.Sprite):
         self.falling = False
         self.tile_velocity = 0
 
-    def update(self):
+    def update(self, keys=None):
+        # keys can be given by tools driving the player, otherwise the keyboard is read
+        if keys is None:
+            keys = pygame.key.get_pressed()
+        self.prev_pos = self.rect.topleft
+        self.steps += 1
+
         # create deltas
         dx = 0
         dy = 0
 
-        keys = pygame.key.get_pressed()
         if keys[pygame.K_RIGHT]:
             self.right = True
             self.left = False
-            dx = 5
-            now = pygame.time.get_ticks()
+            dx = RUN_SPEED
+            now = self.steps
             if now - self.last >= self.delay:
                 self.last = now
                 if self.current_frame >= len(self.run_right_list):
@@ -121,8 +301,8 @@ class Player(pygame.sprite.Sprite):
         elif keys[pygame.K_LEFT]:
             self.right = False
             self.left = True
-            dx = -5
-            now = pygame.time.get_ticks()
+            dx = -RUN_SPEED
+            now = self.steps
             if now - self.last >= self.delay:
                 self.last = now
                 if self.current_frame >= len(self.run_left_list):
@@ -139,11 +319,11 @@ class Player(pygame.sprite.Sprite):
                 self.image = self.stand_left
         if keys[pygame.K_UP] and not self.jumping and not self.falling:
             self.jumping = True
-            dy = -15
+            dy = -JUMP_SPEED
         if not keys[pygame.K_UP]:
             self.jumping = False
 
-        self.velocity_y += 1
+        self.velocity_y += GRAVITY
         if self.velocity_y < 0:
             self.jumping = True
             self.falling = False
@@ -152,26 +332,27 @@ class Player(pygame.sprite.Sprite):
             self.falling = True
 
         # terminal velocity
-        if self.velocity_y >= 3:
-            self.velocity_y = 3
+        if self.velocity_y >= TERMINAL_VELOCITY:
+            self.velocity_y = TERMINAL_VELOCITY
 
         # update delta with velocity
         dy += self.velocity_y
 
         # CAMERA SCROLL (VERTICAL)
-        if self.rect.y <= 10 and self.jumping:
-            dy = 0
-            self.tile_velocity = 3
-        elif self.rect.y >= WIN_HEIGHT - 60 and self.falling:
-            dy = 0
-            self.tile_velocity = -3
+        # the player keeps its spot on screen while the view moves by tile_velocity
+        screen_y = self.camera.to_screen_y(self.rect.y)
+        if screen_y <= 10 and self.jumping:
+            self.tile_velocity = SCROLL_SPEED
+        elif screen_y >= WIN_HEIGHT - 60 and self.falling:
+            self.tile_velocity = -SCROLL_SPEED
         else:
             self.tile_velocity = 0
-        for tile in self.tile_set:
-            tile[1][1] += self.tile_velocity
-        for tile in self.enemy_tile_set:
-            tile[1][1] += self.tile_velocity
-            # tile[1] gets the rectangle with x,y coordinate and [1] gets just the y coordinate to add velocity to
+        if self.tile_velocity:
+            # the tiles used to move before the collision checks, so the player moves first
+            # here and both checks below see it where it is after the scroll
+            self.rect.y -= self.tile_velocity
+            dy = 0
+            self.camera.scroll(-self.tile_velocity)
 
         # keeping player inside of screen horizontally
         if self.rect.x <= 0 and self.left and keys[pygame.K_LEFT]:
@@ -179,39 +360,51 @@ class Player(pygame.sprite.Sprite):
         elif self.rect.x >= WIN_WIDTH - 1 and self.right and keys[pygame.K_RIGHT]:
             dx = 0
 
-            # tiles in layout list
-        for tile in self.tile_set:
-            if tile[1].colliderect(self.rect.x+dx, self.rect.y, self.rect.width,
+        # only look at the grid cells the player could touch this frame. The tests below go on
+        # with dx and dy as the tiles before them changed them: algae push dx 2 pixels further,
+        # and a tile pushes the player out by at most its own height and the player's
+        swept = self.rect.union(self.rect.move(dx, dy)).inflate(4, 2 * (self.tile_size + self.rect.height))
+        solid_tiles = []
+        enemy_tiles = []
+        for tile_rect, kind in self.collision_grid.query(swept):
+            if kind == ENEMY:
+                enemy_tiles.append(tile_rect)
+            else:
+                solid_tiles.append(tile_rect)
+
+        # solid tiles and the door
+        for tile_rect in solid_tiles:
+            if tile_rect.colliderect(self.rect.x+dx, self.rect.y, self.rect.width,
                                    self.rect.height):
                 dx = 0
-            if tile[1].colliderect(self.rect.x, self.rect.y+dy, self.rect.width,
+            if tile_rect.colliderect(self.rect.x, self.rect.y+dy, self.rect.width,
                                    self.rect.height):
                 # collision bottom of platform and top of player
                 if dy < 0:
-                    dy = tile[1].bottom - self.rect.top
+                    dy = tile_rect.bottom - self.rect.top
                     self.velocity_y = 0
                     self.jumping = False
                 # collision top of platform and bottom of player
                 elif self.falling:
-                    dy = tile[1].top - self.rect.bottom
+                    dy = tile_rect.top - self.rect.bottom
                     self.velocity_y = 0
                     self.falling = False
 
         # slow velocity/send backward on green tiles
-        for tile in self.enemy_tile_set:
-            if tile[1].colliderect(self.rect.x+dx, self.rect.y, self.rect.width,
+        for tile_rect in enemy_tiles:
+            if tile_rect.colliderect(self.rect.x+dx, self.rect.y, self.rect.width,
                                    self.rect.height):
                 dx = 0
-            if tile[1].colliderect(self.rect.x, self.rect.y+dy, self.rect.width,
+            if tile_rect.colliderect(self.rect.x, self.rect.y+dy, self.rect.width,
                                    self.rect.height):
                 # collision bottom of platform and top of player
                 if dy < 0:
-                    dy = tile[1].bottom - self.rect.top
+                    dy = tile_rect.bottom - self.rect.top
                     self.velocity_y = 0
                     self.jumping = False
                 # collision top of platform and bottom of player
                 elif self.falling:
-                    dy = tile[1].top - self.rect.bottom
+                    dy = tile_rect.top - self.rect.bottom
                     self.velocity_y = 0
                     self.falling = False
                     if self.right:
@@ -222,105 +415,12 @@ class Player(pygame.sprite.Sprite):
         self.rect.x += dx
         self.rect.y += dy
 
-        self.display.blit(self.image, self.rect)
-
-    def load_images(self):
-        diver = SpriteSheet("assets/diver.png")
-        right_run_1 = diver.image_at((41, 99, 14, 27), -1)
-        self.run_right_list.append(right_run_1)
-        right_run_2 = diver.image_at((22, 131, 14, 27), -1)
-        self.run_right_list.append(right_run_2)
-        self.stand_right = diver.image_at((41, 3, 14, 27), -1)
-        right_run_3 = diver.image_at((41, 131, 14, 27), -1)
-        self.run_right_list.append(right_run_3)
-
-        left_run_1 = diver.image_at((60, 99, 14, 27), -1)
-        self.run_left_list.append(left_run_1)
-        left_run_2 = diver.image_at((3, 131, 14, 27), -1)
-        self.run_left_list.append(left_run_2)
-        self.stand_left = diver.image_at((60, 3, 14, 27), -1)
-        left_run_3 = diver.image_at((60, 131, 14, 27), -1)
-        self.run_left_list.append(left_run_3)
-
-
-class Shark(pygame.sprite.Sprite):
-    def __init__(self, x, y, tile_size, tile_set, display, speed, direct):
-        pygame.sprite.Sprite.__init__(self)
-        self.tile_size = tile_size
-        self.tile_set = tile_set
-        self.display = display
-        self.speed = speed
-        self.direct = direct
-        self.right_list = []
-        self.left_list = []
-        self.stand_left = None
-        self.load_images()
-        self.image = self.right_list[1]
-        self.image_rect = self.image.get_rect()
-        self.image_rect.x = x
-        self.image_rect.y = y
-        self.last = pygame.time.get_ticks()
-        self.delay = 100
-        self.current_frame = 0
-        self.right = True
-        self.left = False
-
-    def update(self):
-        dx = 0
-        dy = 0
-
-        if self. direct == 0:
-            self.right = True
-            self.left = False
-            dx = self.speed
-            now = pygame.time.get_ticks()
-            time = 0
-            if now - self.last >= self.delay:
-                self.last = now
-                time += 1
-                if self.current_frame >= len(self.right_list):
-                    self.current_frame = 0
-                    self.current_frame = (self.current_frame + 1)
-                self.image = self.right_list[self.current_frame]
-                self.current_frame += 1
-        elif self. direct == 1:
-            self.right = False
-            self.left = True
-            dx = self.speed * -1
-            now = pygame.time.get_ticks()
-            time = 0
-            if now - self.last >= self.delay:
-                self.last = now
-                time += 1
-                if self.current_frame >= len(self.left_list):
-                    self.current_frame = 0
-                    self.current_frame = (self.current_frame + 1)
-                self.image = self.left_list[self.current_frame]
-                self.current_frame += 1
-
-        self.image_rect.x += dx
-
-        self.display.blit(self.image, self.image_rect)
-
     def load_images(self):
-        shark = SpriteSheet("assets/shark.png")
-        shark_r1 = shark.image_at((155, 28, 104, 34), -1)
-        self.right_list.append(shark_r1)
-        shark_r2 = shark.image_at((155, 65, 104, 34), -1)
-        self.right_list.append(shark_r2)
-        shark_r3 = shark.image_at((155, 154, 104, 34), -1)
-        self.right_list.append(shark_r3)
-        shark_r4 = shark.image_at((155, 195, 104, 34), -1)
-        self.right_list.append(shark_r4)
-
-        shark_l1 = shark.image_at((8, 28, 104, 32), -1)
-        self.left_list.append(shark_l1)
-        shark_l2 = shark.image_at((8, 65, 104, 37), -1)
-        self.left_list.append(shark_l2)
-        shark_l3 = shark.image_at((8, 154, 104, 37), -1)
-        self.left_list.append(shark_l3)
-        shark_l4 = shark.image_at((8, 195, 104, 37), -1)
-        self.left_list.append(shark_l4)
+        for i in range(1, 4):
+            self.run_right_list.append(asset_cache.named(f'diver_right_run_{i}'))
+            self.run_left_list.append(asset_cache.named(f'diver_left_run_{i}'))
+        self.stand_right = asset_cache.named('diver_stand_right')
+        self.stand_left = asset_cache.named('diver_stand_left')
 
 
 class Door(pygame.sprite.Sprite):
@@ -332,143 +432,369 @@ class Door(pygame.sprite.Sprite):
         self.rect.y = y
 
 
+class TileView:
+    # the tiles of the bands a Layout has made, as the (image, rect) pairs the tile lists used
+    # to hold, made from the level cells when asked for. The exit is (image, rect, 1)
+    def __init__(self, layout, pattern):
+        self.layout = layout
+        self.pattern = pattern
+        # cells() for the bands in cached_bands
+        self.cached_bands = None
+        self.cached_cells = []
+
+    def __iter__(self):
+        layout = self.layout
+        for index in sorted(layout.bands):
+            first = index * CHUNK_ROWS
+            for column, row, tile_id in layout.tiles(first, first + CHUNK_ROWS, self.pattern):
+                yield layout.tile(column, row, tile_id)
+
+    def __len__(self):
+        return len(self.cells())
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[k] for k in range(*i.indices(len(self)))]
+        level = self.layout.level
+        # the list raises the IndexError
+        index = self.cells()[i]
+        row, column = divmod(index, level.width)
+        return self.layout.tile(column, row, level.cells[level.offset + index])
+
+    def cells(self):
+        """Cell indexes of the tiles, in order. Found once for the bands that exist, so looking
+        tiles up one index at a time doesn't scan the bands again every time.
+        """
+        layout = self.layout
+        bands = tuple(sorted(layout.bands))
+        if bands != self.cached_bands:
+            width = layout.level.width
+            self.cached_cells = [row * width + column for index in bands
+                                 for column, row, tile_id in
+                                 layout.tiles(index * CHUNK_ROWS, (index + 1) * CHUNK_ROWS, self.pattern)]
+            self.cached_bands = bands
+        return self.cached_cells
+
+
 class Layout(pygame.sprite.Sprite):
     # creates layout of the game using sprite sheets
-    def __init__(self, size):
+    def __init__(self, size, level=None):
         pygame.sprite.Sprite.__init__(self)
         self.size = size
+        # a levels.Level, or rows of tile characters, the default is LEVEL_FILE
+        if level is None:
+            level = load_level(LEVEL_FILE)
+        elif not isinstance(level, Level):
+            level = Level.from_rows(level)
+        self.level = level
         # main rocks tiles
-        self.tile_sheet = SpriteSheet('assets/tilemap_2.png')
-        self.left_end_rock = self.tile_sheet.image_at((0, 0, 64, 64), -2)
-        self.left_rock = self.tile_sheet.image_at((65, 0, 64, 64), -2)
-        self.right_rock = self.tile_sheet.image_at((65, 64, 64, 64), -2)
-        self.right_end_rock = self.tile_sheet.image_at((0, 64, 64, 64), -2)
-        self.left_end_rock = pygame.transform.scale(self.left_end_rock, (size, size))
-        self.left_rock = pygame.transform.scale(self.left_rock, (size, size))
-        self.right_rock = pygame.transform.scale(self.right_rock, (size, size))
-        self.right_end_rock = pygame.transform.scale(self.right_end_rock, (size, size))
+        self.left_end_rock = asset_cache.named('left_end_rock', size)
+        self.left_rock = asset_cache.named('left_rock', size)
+        self.right_rock = asset_cache.named('right_rock', size)
+        self.right_end_rock = asset_cache.named('right_end_rock', size)
         # enemy rocks tiles
-        self.enemy_tile_sheet = SpriteSheet('assets/enemy_rocks.png')
-        self.le_enemy_rock = self.enemy_tile_sheet.image_at((0, 0, 64, 64), -2)
-        self.l_enemy_rock = self.enemy_tile_sheet.image_at((65, 0, 64, 64), -2)
-        self.r_enemy_rock = self.enemy_tile_sheet.image_at((65, 64, 64, 64), -2)
-        self.re_enemy_rock = self.enemy_tile_sheet.image_at((0, 64, 64, 64), -2)
-        self.le_enemy_rock = pygame.transform.scale(self.le_enemy_rock, (size, size))
-        self.l_enemy_rock = pygame.transform.scale(self.l_enemy_rock, (size, size))
-        self.r_enemy_rock = pygame.transform.scale(self.r_enemy_rock, (size, size))
-        self.re_enemy_rock = pygame.transform.scale(self.re_enemy_rock, (size, size))
+        self.le_enemy_rock = asset_cache.named('le_enemy_rock', size)
+        self.l_enemy_rock = asset_cache.named('l_enemy_rock', size)
+        self.r_enemy_rock = asset_cache.named('r_enemy_rock', size)
+        self.re_enemy_rock = asset_cache.named('re_enemy_rock', size)
         # door tile
-        self.door_sheet = SpriteSheet('assets/door_image.png')
-        self.door = self.door_sheet.image_at((0, 0, 128, 128))
-        self.door = pygame.transform.scale(self.door, (size, size))
+        self.door = asset_cache.named('door', size)
+        # tile byte -> image, None for water and the cells of sprites
+        self.palette = [None] * 256
+        for char, image in zip(b'1234abcdD', [self.left_end_rock, self.left_rock, self.right_rock,
+                                              self.right_end_rock, self.le_enemy_rock, self.l_enemy_rock,
+                                              self.r_enemy_rock, self.re_enemy_rock, self.door]):
+            self.palette[char] = image
 
         self.player = None
+        self.player_spawn = None
         self.exit = None
+        # set once the player reaches the exit, see at_exit(), or is caught by a shark (only
+        # with SHARKS_BITE)
+        self.won = False
+        self.lost = False
+        # game() swaps in a FrameProfiler when profiling
+        self.profiler = NULL_PROFILER
+        # built by navigation() the first time something needs it
+        self.nav_graph = None
 
         self.blocks_group = pygame.sprite.Group()
         self.player_group = pygame.sprite.GroupSingle()
-        self.enemy_group = pygame.sprite.GroupSingle()
         self.exit_group = pygame.sprite.GroupSingle()
-        self.tile_list = []
-        self.enemy_tile_list = []
-
-        for i, row in enumerate(LAYOUT):
-            for j, col in enumerate(row):
-                x_val = j * self.size
-                y_val = i * self.size
-
-                if col == "1":
-                    image_rect = self.left_end_rock.get_rect()
-                    image_rect.x = x_val
-                    image_rect.y = y_val
-                    tile = (self.left_end_rock, image_rect)
-                    self.tile_list.append(tile)
-
-                if col == "2":
-                    image_rect = self.left_rock.get_rect()
-                    image_rect.x = x_val
-                    image_rect.y = y_val
-                    tile = (self.left_rock, image_rect)
-                    self.tile_list.append(tile)
-
-                if col == "3":
-                    image_rect = self.right_rock.get_rect()
-                    image_rect.x = x_val
-                    image_rect.y = y_val
-                    tile = (self.right_rock, image_rect)
-                    self.tile_list.append(tile)
-
-                if col == "4":
-                    image_rect = self.right_end_rock.get_rect()
-                    image_rect.x = x_val
-                    image_rect.y = y_val
-                    tile = (self.right_end_rock, image_rect)
-                    self.tile_list.append(tile)
-
-                # door/exit tile, adding 1 for different collision to end game
-                if col == "D":
-                    self.exit = Door(x_val, y_val)
-                    image_rect = self.door.get_rect()
-                    image_rect.x = x_val
-                    image_rect.y = y_val
-                    tile = (self.door, image_rect, 1)
-                    self.tile_list.append(tile)
-                    self.exit_group.add(self.exit)
-
-                # enemy tiles
-                if col == "a":
-                    image_rect = self.le_enemy_rock.get_rect()
-                    image_rect.x = x_val
-                    image_rect.y = y_val
-                    tile = (self.le_enemy_rock, image_rect)
-                    self.enemy_tile_list.append(tile)
-
-                if col == "b":
-                    image_rect = self.l_enemy_rock.get_rect()
-                    image_rect.x = x_val
-                    image_rect.y = y_val
-                    tile = (self.l_enemy_rock, image_rect)
-                    self.enemy_tile_list.append(tile)
-
-                if col == "c":
-                    image_rect = self.r_enemy_rock.get_rect()
-                    image_rect.x = x_val
-                    image_rect.y = y_val
-                    tile = (self.r_enemy_rock, image_rect)
-                    self.enemy_tile_list.append(tile)
-
-                if col == "d":
-                    image_rect = self.re_enemy_rock.get_rect()
-                    image_rect.x = x_val
-                    image_rect.y = y_val
-                    tile = (self.re_enemy_rock, image_rect)
-                    self.enemy_tile_list.append(tile)
-
-                if col == "P":
-                    self.player = Player(TILE_SIZE, WIN_HEIGHT - TILE_SIZE, TILE_SIZE, self.tile_list, self.enemy_tile_list,
-                                    SCREEN)
-                    self.player.rect.x = x_val
-                    self.player.rect.y = y_val
-                    self.player_group.add(self.player)
-
-                if col == "e":
-                    enemy = Shark(TILE_SIZE, WIN_HEIGHT - TILE_SIZE, TILE_SIZE, self.tile_list, SCREEN, 2, 0)
-                    enemy.image_rect.x = x_val
-                    enemy.image_rect.y = y_val
-                    self.enemy_group.add(enemy)
-
-    def update(self):
-        for tile in self.tile_list:
-            SCREEN.blit(tile[0], tile[1])
-        for tile in self.enemy_tile_list:
-            SCREEN.blit(tile[0], tile[1])
-
-        if self.player.rect.right == self.exit.rect.left:
-            quit()
+        # tiles of the bands that exist, see stream()
+        self.tile_list = TileView(self, SOLID_TILE)
+        self.enemy_tile_list = TileView(self, ENEMY_TILE)
+        self.collision_grid = CollisionGrid(size)
+        self.camera = Camera()
+
+        # player, sharks and the exit come from the level's entity table
+        shark_spawns = []
+        self.door_spawns = []
+        for col, j, i in self.level.entities:
+            x_val = j * self.size
+            y_val = i * self.size
+
+            # door/exit, its tile is made with the tiles around it
+            if col == "D":
+                self.exit = Door(x_val, y_val)
+                self.door_spawns.append((x_val, y_val))
+                self.exit_group.add(self.exit)
+
+            if col == "P":
+                self.player_spawn = (x_val, y_val)
+
+            if col == "e":
+                shark_spawns.append((x_val, y_val))
+
+        # world rects of the exit tiles, the Door sprite's rect is not where its tile is
+        self.exit_rects = [self.tile_rect(x // size, y // size, DOOR_ID) for x, y in self.door_spawns]
+
+        # all sharks live in one swarm that updates them together
+        self.sharks = SharkSwarm(shark_spawns, SHARK_SPEED,
+                                 [asset_cache.named(f'shark_right_{i}') for i in range(1, 5)],
+                                 [asset_cache.named(f'shark_left_{i}') for i in range(1, 5)])
+
+        # collision and chunks only exist for the bands of CHUNK_ROWS rows around the camera,
+        # stream() makes them as they come near and drops them again once they are far away
+        self.chunk_height = CHUNK_ROWS * size
+        self.band_count = -(-level.height // CHUNK_ROWS)
+        # band index -> [chunk, collision rects], the chunk is only baked once the band is
+        # drawn, so a layout that is never drawn never has any
+        self.bands = {}
+        # merged collision rects of the bands that exist
+        self.collision_rects = []
+        self.reset()
+
+    def reset(self):
+        """Start the level over: the player, sharks, camera and outcome go back to how the level
+        began. Tiles, chunks and collision never change, so the bands that exist are kept.
+        """
+        self.won = False
+        self.lost = False
+        self.camera.y = 0
+        self.camera.prev_y = 0
+        self.player = Player(TILE_SIZE, WIN_HEIGHT - TILE_SIZE, TILE_SIZE, self.collision_grid, self.camera)
+        self.player.rect.topleft = self.player_spawn
+        self.player.prev_pos = self.player.rect.topleft
+        self.player_group.add(self.player)
+        self.sharks.reset()
+        self.stream()
+        # what draw() put on screen last time, for erasing it again
+        self.drawn_sprites = []
+        self.drawn_camera_y = None
+
+    def stream(self):
+        """Make the bands within STREAM_BANDS of the view and release those further away, so
+        memory and work depend on the size of the view and not the height of the level.
+        """
+        first = max(self.camera.y // self.chunk_height - STREAM_BANDS, 0)
+        last = min((self.camera.y + WIN_HEIGHT - 1) // self.chunk_height + STREAM_BANDS, self.band_count - 1)
+        # one more band is kept on each side, so going back and forth over an edge doesn't
+        # make and release the same band every step
+        far = [index for index in self.bands if index < first - 1 or index > last + 1]
+        for index in far:
+            self.release_band(index)
+        for index in range(first, last + 1):
+            if index not in self.bands:
+                self.make_band(index)
+
+    def band(self, index):
+        """The [chunk, collision rects] of band index, made if needed."""
+        band = self.bands.get(index)
+        if band is None:
+            band = self.make_band(index)
+        return band
+
+    def chunk(self, index):
+        """The pre-rendered tiles of band index."""
+        band = self.band(index)
+        if band[0] is None:
+            band[0] = self.bake_chunk(index)
+        return band[0]
+
+    def make_band(self, index):
+        first = index * CHUNK_ROWS
+        collision_rects = merge_collision_rects(self.level, self.size, first, first + CHUNK_ROWS)
+        for rect, kind in collision_rects:
+            self.collision_grid.add(rect, kind)
+        band = [None, collision_rects]
+        self.bands[index] = band
+        self.collision_rects.extend(collision_rects)
+        return band
+
+    def release_band(self, index):
+        chunk, collision_rects = self.bands.pop(index)
+        for rect, kind in collision_rects:
+            self.collision_grid.remove(rect, kind)
+        self.collision_rects = [entry for i in sorted(self.bands) for entry in self.bands[i][1]]
+
+    def tiles(self, first, last, pattern=ANY_TILE):
+        """(column, row, tile byte) of the tiles matching pattern in rows first to last (exclusive),
+        read straight from the level's cells.
+        """
+        level = self.level
+        width = level.width
+        cells = level.cells
+        offset = level.offset
+        for match in pattern.finditer(cells, offset + first * width, offset + min(last, level.height) * width):
+            index = match.start() - offset
+            yield index % width, index // width, cells[match.start()]
+
+    def tile_rect(self, column, row, tile_id):
+        """World rect of a tile, the size of its image."""
+        return self.palette[tile_id].get_rect(topleft=(column * self.size, row * self.size))
+
+    def tile(self, column, row, tile_id):
+        """A tile as an (image, rect) pair, and (image, rect, 1) for the exit."""
+        if tile_id == DOOR_ID:
+            return (self.door, self.tile_rect(column, row, tile_id), 1)
+        return (self.palette[tile_id], self.tile_rect(column, row, tile_id))
+
+    def gradient(self, top, height):
+        """The water of world rows top to top + height, as wide as the level. It fades from BG at
+        the top of the level to BG_DEEP at the bottom, worked out for one column of pixels at
+        once and stretched sideways.
+        """
+        depth = np.arange(top, top + height) / max(self.level.height * self.size - 1, 1)
+        colors = np.array(BG) + np.outer(depth, np.subtract(BG_DEEP, BG))
+        column = pygame.surfarray.make_surface(np.rint(colors).astype(np.uint8)[None])
+        return pygame.transform.scale(column, (self.level.width * self.size, height))
+
+    def bake_chunk(self, index):
+        """Pre-render the background and static tiles of band index into a surface chunk_height
+        pixels tall. The chunk is opaque, drawing it is all the background a frame needs.
+        """
+        top = index * self.chunk_height
+        height = min(self.chunk_height, self.level.height * self.size - top)
+        chunk = self.gradient(top, height).convert()
+        first = index * CHUNK_ROWS
+        chunk.blits([(self.palette[tile_id], (column * self.size, row * self.size - top))
+                     for column, row, tile_id in self.tiles(first, first + CHUNK_ROWS)], False)
+        return chunk
+
+    def update(self, keys=None):
+        self.update_player(keys)
+        self.update_sharks()
+
+    def update_player(self, keys=None):
+        """First half of a step, everything but the sharks."""
+        if self.at_exit():
+            self.won = True
         #pygame.sprite.groupcollide(self.player_group, self.exit_group, True, True)
 
-        self.player_group.update()
-        self.enemy_group.update()
+        self.camera.prev_y = self.camera.y
+        self.player_group.update(keys)
+        # the camera may have moved on to other bands
+        self.stream()
+        self.profiler.mark('player')
+
+    def at_exit(self):
+        """True if the player is up against the side of an exit tile, in world coordinates."""
+        return self.player.rect.inflate(2, 0).collidelist(self.exit_rects) != -1
+
+    def update_sharks(self):
+        """Second half of a step: the sharks move, then catch the player if they touch it and
+        SHARKS_BITE is on.
+        """
+        self.sharks.update()
+        if SHARKS_BITE and self.sharks.hits(self.player.rect):
+            self.lost = True
+        self.profiler.mark('sharks')
+
+    def background_blits(self, camera_y, area):
+        """(chunk, screen position, chunk area) of the tile chunks inside area of the screen."""
+        # only the one or two chunks inside the viewport get drawn
+        first = max((camera_y + area.top) // self.chunk_height, 0)
+        last = min((camera_y + area.bottom - 1) // self.chunk_height, self.band_count - 1)
+        return [(self.chunk(index), area.topleft, area.move(0, camera_y - index * self.chunk_height))
+                for index in range(first, last + 1)]
+
+    def draw_background(self, surface, camera_y, areas=None):
+        """Draw the background and the tile chunks, on all of surface or only inside areas."""
+        if areas is None:
+            areas = [surface.get_rect()]
+        # the level on screen, the chunks cover it and only what is outside needs a plain fill
+        level_top = -camera_y
+        level_bottom = self.level.height * self.size - camera_y
+        width = self.level.width * self.size
+        blits = []
+        for area in areas:
+            if not area:
+                # clipped away, it is off screen and may be far from any band that exists
+                continue
+            if area.top < level_top:
+                surface.fill(BG, area.clip(area.left, area.top, area.width, level_top - area.top))
+            if area.bottom > level_bottom:
+                surface.fill(BG_DEEP, area.clip(area.left, level_bottom, area.width, area.bottom - level_bottom))
+            if area.right > width:
+                surface.fill(BG, area.clip(width, area.top, area.right - width, area.height))
+            blits.extend(self.background_blits(camera_y, area))
+        # the tiles of every area in one call
+        surface.blits(blits, False)
+
+    def draw(self, surface, dirty=None, alpha=1.0, overlays=()):
+        """Draw the level and its sprites, adding the changed regions to dirty.
+        alpha (0-1) is how far the frame is between the previous and the latest step.
+        overlays are screen rects drawn over the level after every draw() (the HUD), which
+        have to be painted over before the last frame is scrolled.
+        Nothing here changes the simulation, and every layer is drawn with one blits call.
+        """
+        camera_y = self.camera.view_y(alpha)
+        sprites = [(self.player.image, self.interpolate(self.player.prev_pos, self.player.rect, alpha, camera_y))]
+        sprites.extend(self.sharks.visible(camera_y, alpha))
+
+        if dirty is not None and dirty.enabled and camera_y == self.drawn_camera_y \
+                and sprites == self.drawn_sprites:
+            # nothing moved or changed since the last frame
+            self.profiler.mark('draw_level')
+            return
+
+        screen = surface.get_rect()
+        dy = camera_y - self.drawn_camera_y if self.drawn_camera_y is not None else screen.height
+        if dirty is None or not dirty.enabled or abs(dy) >= screen.height:
+            # first frame or a jump, draw everything
+            self.draw_background(surface, camera_y)
+            if dirty is not None:
+                dirty.add_all()
+        elif dy:
+            # the view scrolled: clear the sprites and overlays off the last frame, shift it
+            # and only draw the strip the scroll uncovered
+            areas = [rect.clip(screen) for image, rect in self.drawn_sprites]
+            areas.extend(rect.clip(screen) for rect in overlays)
+            self.draw_background(surface, self.drawn_camera_y, areas)
+            surface.scroll(0, -dy)
+            if dy > 0:
+                exposed = pygame.Rect(0, screen.height - dy, screen.width, dy)
+            else:
+                exposed = pygame.Rect(0, 0, screen.width, -dy)
+            self.draw_background(surface, camera_y, [exposed])
+            dirty.add_all()
+        else:
+            # paint over where the sprites were last frame
+            self.draw_background(surface, camera_y, [rect.clip(screen) for image, rect in self.drawn_sprites])
+            for image, rect in self.drawn_sprites:
+                dirty.add(rect)
+        self.profiler.mark('draw_level')
+
+        surface.blits(sprites, False)
+        if dirty is not None:
+            for image, rect in sprites:
+                dirty.add(rect)
+        self.drawn_sprites = sprites
+        self.drawn_camera_y = camera_y
+        self.profiler.mark('draw_sprites')
+
+    def navigation(self):
+        """The level's NavGraph, for enemies that path towards the player."""
+        if self.nav_graph is None:
+            self.nav_graph = NavGraph(self.level)
+        return self.nav_graph
+
+    def interpolate(self, prev_pos, rect, alpha, camera_y):
+        """Screen rect of a sprite blended between its last two positions."""
+        x = round(prev_pos[0] + (rect.x - prev_pos[0]) * alpha)
+        y = round(prev_pos[1] + (rect.y - prev_pos[1]) * alpha)
+        return pygame.Rect(x, y - camera_y, rect.width, rect.height)
 
     def get_layout(self):
         return self.tile_list
@@ -476,5 +802,5 @@ class Layout(pygame.sprite.Sprite):
 
     def get_groups(self):
         return self.blocks_group
-        return self.enemy_group
+        return self.sharks
 